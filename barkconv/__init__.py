@@ -0,0 +1,22 @@
+# Converter between J3D color register animations (BRK) and json.
+#
+#     import barkconv
+#     brk = barkconv.load_brk("anim.brk")
+#     barkconv.dump_json(brk, "anim.json")
+#     barkconv.write_brk(barkconv.load_json("anim.json"), "anim.brk")
+#
+# Importing the package and reading BRKs doesn't import json or any other module 
+# that is only needed for json, evaluating animations or the command line.
+
+from .brk import (
+    BRKFILEMAGIC, AnimComponent, AnimTrack, KeyframeView, ColorAnimation, LazyAnimationList, 
+    StringTable, BRKAnim
+)
+from .convert import (
+    load_brk, load_json, dump_json, write_brk, 
+    convert_bytes, convert_file, convert_batch, find_inputs, is_brk_file
+)
+from .cache import ConversionCache
+from .profiling import Profiler, set_profiler
+from .archive import RARC, ArchiveFile, load_archive, is_archive, yaz0_compress, yaz0_decompress
+from .validate import Issue, validate_bytes, validate_file, validate_files
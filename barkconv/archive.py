@@ -0,0 +1,327 @@
+import struct
+
+from .brk import BRKFILEMAGIC, BRKAnim, read_cstring
+
+YAZ0MAGIC = b"Yaz0"
+RARCMAGIC = b"RARC"
+
+# Header of a Yaz0 file: magic, decompressed size and 8 reserved bytes
+YAZ0_HEADER = struct.Struct(">4sI8x")
+# RARC magic, file size, header size, offset of the file data (from the end of the header),
+# size of the file data and the parts of it that are loaded to MRAM and ARAM
+RARC_HEADER = struct.Struct(">4sIIIIII4x")
+# Node count and offset, file entry count and offset, string table size and offset
+# (offsets from the end of the RARC header), next free file id and whether file ids match entry indices
+RARC_INFO = struct.Struct(">IIIIIIHB5x")
+# Type (first 4 characters of the name in upper case), name offset, name hash,
+# file entry count and index of the first file entry
+RARC_NODE = struct.Struct(">4sIHHI")
+# File id, name hash, flags and name offset (upper 8 and lower 24 bits),
+# data offset (node index for directories) and data size
+RARC_ENTRY = struct.Struct(">HHIII4x")
+
+# Flags of a RARC file entry
+ARCHIVE_FILE = 0x01
+ARCHIVE_DIRECTORY = 0x02
+ARCHIVE_COMPRESSED = 0x04
+ARCHIVE_MRAM = 0x10
+ARCHIVE_ARAM = 0x20
+ARCHIVE_DVD = 0x40
+ARCHIVE_YAZ0 = 0x80
+
+YAZ0_WINDOW = 0x1000
+YAZ0_MAX_LENGTH = 0x111
+
+
+def is_yaz0(data):
+    return bytes(data[:4]) == YAZ0MAGIC
+
+
+# Decompress Yaz0 data. With limit, stop after that many bytes.
+def yaz0_decompress(data, limit=None):
+    if not is_yaz0(data):
+        raise RuntimeError("Not Yaz0 compressed data")
+    
+    data = bytes(data)
+    size = YAZ0_HEADER.unpack_from(data)[1]
+    if limit is not None:
+        size = min(size, limit)
+    out = bytearray()
+    src = YAZ0_HEADER.size
+    
+    try:
+        while len(out) < size:
+            code = data[src]
+            src += 1
+            
+            # 8 literal bytes in a row are common enough to copy them in one go
+            if code == 0xFF:
+                out += data[src:src+8]
+                src += 8
+                continue
+            
+            for bit in range(8):
+                if len(out) >= size:
+                    break
+                
+                if code & (0x80 >> bit):
+                    out.append(data[src])
+                    src += 1
+                else:
+                    byte1, byte2 = data[src], data[src+1]
+                    src += 2
+                    distance = ((byte1 & 0x0F) << 8 | byte2) + 1
+                    length = byte1 >> 4
+                    if length == 0:
+                        length = data[src] + 0x12
+                        src += 1
+                    else:
+                        length += 2
+                    
+                    start = len(out) - distance
+                    if start < 0:
+                        raise RuntimeError("Invalid back reference in Yaz0 data at offset 0x{0:x}".format(src))
+                    
+                    if length <= distance:
+                        out += out[start:start+length]
+                    else:
+                        # The copy overlaps the bytes it produces, so the last distance bytes repeat
+                        out += (out[start:] * (length // distance + 1))[:length]
+    except IndexError:
+        raise RuntimeError("Yaz0 data ends before {0} bytes were decompressed".format(size))
+    
+    del out[size:]
+    return bytes(out)
+
+
+# Longest earlier occurrence of the bytes at pos within the window. The search for the
+# match is done by bytes.rfind, each found match is extended as far as it goes and then
+# a match that is one byte longer is searched until there is none.
+def _find_match(data, pos):
+    max_length = min(YAZ0_MAX_LENGTH, len(data) - pos)
+    if max_length < 3:
+        return 0, 0
+    
+    window = max(0, pos - YAZ0_WINDOW)
+    best_offset, best_length = 0, 0
+    length = 3
+    
+    while length <= max_length:
+        # The match has to start before pos but may run into it
+        offset = data.rfind(data[pos:pos+length], window, pos+length-1)
+        if offset == -1:
+            break
+        
+        while length < max_length and data[offset+length] == data[pos+length]:
+            length += 1
+        best_offset, best_length = offset, length
+        length += 1
+    
+    return best_offset, best_length
+
+
+def yaz0_compress(data):
+    data = bytes(data)
+    out = bytearray(YAZ0_HEADER.pack(YAZ0MAGIC, len(data)))
+    pos = 0
+    
+    while pos < len(data):
+        code_pos = len(out)
+        out.append(0)
+        code = 0
+        
+        for bit in range(8):
+            if pos >= len(data):
+                break
+            
+            offset, length = _find_match(data, pos)
+            if length < 3:
+                code |= 0x80 >> bit
+                out.append(data[pos])
+                pos += 1
+            else:
+                distance = pos - offset - 1
+                if length >= 0x12:
+                    out += bytes((distance >> 8, distance & 0xFF, length - 0x12))
+                else:
+                    out += bytes(((length - 2) << 4 | distance >> 8, distance & 0xFF))
+                pos += length
+        
+        out[code_pos] = code
+    
+    return bytes(out)
+
+
+def align32(value):
+    return (value + 0x1F) & ~0x1F
+
+
+# A file in a RARC. data is the file as stored in the archive, which can be Yaz0 compressed.
+class ArchiveFile(object):
+    def __init__(self, path, data, flags, entry_index):
+        self.path = path
+        self.data = data
+        self.flags = flags
+        self._entry_index = entry_index
+    
+    def is_compressed(self):
+        return bool(self.flags & ARCHIVE_COMPRESSED) and is_yaz0(self.data)
+    
+    # Decompressed contents of the file
+    def contents(self):
+        if self.is_compressed():
+            return yaz0_decompress(self.data)
+        return bytes(self.data)
+    
+    # Replace the contents of the file, they are compressed again if the file was compressed
+    def replace(self, contents):
+        if self.is_compressed():
+            self.data = yaz0_compress(contents)
+        else:
+            self.data = bytes(contents)
+    
+    def is_brk(self):
+        if self.is_compressed():
+            return yaz0_decompress(self.data, 8) == BRKFILEMAGIC
+        return bytes(self.data[:8]) == BRKFILEMAGIC
+
+
+# RARC archive, optionally Yaz0 compressed as a whole (.szs). Only the contents of files can
+# be changed. Everything before the file data (nodes, file entries and names) is kept as it is
+# when the archive is rebuilt, apart from the offsets and sizes of the files.
+class RARC(object):
+    def __init__(self):
+        self.files = []
+        self.compressed = False
+        self._metadata = None
+        self._entries_start = None
+    
+    @classmethod
+    def from_bytes(cls, data):
+        rarc = cls()
+        if is_yaz0(data):
+            data = yaz0_decompress(data)
+            rarc.compressed = True
+        
+        data = memoryview(data)
+        if len(data) < RARC_HEADER.size + RARC_INFO.size:
+            raise RuntimeError("File is too small to be a RARC archive")
+        
+        magic, size, header_size, data_offset, data_size, mram_size, aram_size = RARC_HEADER.unpack_from(data)
+        if magic != RARCMAGIC:
+            raise RuntimeError("Not a RARC archive, magic is {0}".format(bytes(magic)))
+        
+        (node_count, node_offset, entry_count, entry_offset,
+            string_size, string_offset, next_id, sync_ids) = RARC_INFO.unpack_from(data, header_size)
+        nodes_start = header_size + node_offset
+        entries_start = header_size + entry_offset
+        strings_start = header_size + string_offset
+        data_start = header_size + data_offset
+        
+        if entries_start + entry_count*RARC_ENTRY.size > len(data) or data_start > len(data):
+            raise RuntimeError("RARC file entries or data are out of bounds")
+        
+        rarc._metadata = bytes(data[:data_start])
+        rarc._entries_start = entries_start
+        
+        def name_at(offset):
+            return read_cstring(data, strings_start + offset).decode("shift_jis")
+        
+        # Walk the directory tree from the root node to get the path of every file
+        pending = [(0, "")]
+        visited = set()
+        while pending:
+            node_index, path = pending.pop()
+            if node_index in visited or node_index >= node_count:
+                continue
+            visited.add(node_index)
+            
+            node_type, name_offset, name_hash, count, first = RARC_NODE.unpack_from(data, nodes_start + node_index*RARC_NODE.size)
+            for i in range(first, first+count):
+                file_id, name_hash, flags_name, offset, size = RARC_ENTRY.unpack_from(data, entries_start + i*RARC_ENTRY.size)
+                flags = flags_name >> 24
+                name = name_at(flags_name & 0xFFFFFF)
+                
+                if flags & ARCHIVE_DIRECTORY:
+                    if name not in (".", ".."):
+                        pending.append((offset, path + name + "/"))
+                else:
+                    if data_start + offset + size > len(data):
+                        raise RuntimeError("Data of {0} is out of bounds".format(path + name))
+                    filedata = bytes(data[data_start+offset:data_start+offset+size])
+                    rarc.files.append(ArchiveFile(path + name, filedata, flags, i))
+        
+        rarc.files.sort(key=lambda file: file._entry_index)
+        return rarc
+    
+    def find(self, path):
+        for file in self.files:
+            if file.path == path:
+                return file
+        return None
+    
+    def brk_files(self):
+        return [file for file in self.files if file.is_brk()]
+    
+    # Path and BRKAnim of every BRK in the archive
+    def brks(self, lazy=False):
+        return [(file.path, BRKAnim.from_bytes(file.contents(), lazy)) for file in self.brk_files()]
+    
+    def replace_brk(self, path, brk, packing="dedup", compact_tangents=False):
+        file = self.find(path)
+        if file is None:
+            raise RuntimeError("No file {0} in archive".format(path))
+        file.replace(brk.to_bytes(packing, compact_tangents))
+    
+    # Rebuild the archive. The files are laid out in the order of their old offsets, so files
+    # loaded to MRAM stay in front of the ones loaded to ARAM. By default the archive is
+    # Yaz0 compressed if it was read from a compressed archive.
+    def to_bytes(self, compress=None):
+        if compress is None:
+            compress = self.compressed
+        
+        buffer = bytearray(self._metadata)
+        header_size = RARC_HEADER.unpack_from(buffer)[2]
+        data_start = len(buffer)
+        entry_offset = lambda file: self._entries_start + file._entry_index*RARC_ENTRY.size
+        
+        files = sorted(self.files, key=lambda file: (RARC_ENTRY.unpack_from(buffer, entry_offset(file))[3], file._entry_index))
+        load_flags = any(file.flags & (ARCHIVE_MRAM | ARCHIVE_ARAM | ARCHIVE_DVD) for file in files)
+        mram_size = aram_size = 0
+        
+        for file in files:
+            offset = len(buffer) - data_start
+            buffer += file.data
+            buffer += bytes(align32(len(buffer)) - len(buffer))
+            
+            file_id, name_hash, flags_name, old_offset, old_size = RARC_ENTRY.unpack_from(buffer, entry_offset(file))
+            RARC_ENTRY.pack_into(buffer, entry_offset(file), file_id, name_hash, flags_name, offset, len(file.data))
+            
+            if file.flags & ARCHIVE_ARAM:
+                aram_size += align32(len(file.data))
+            elif file.flags & ARCHIVE_MRAM or not load_flags:
+                mram_size += align32(len(file.data))
+        
+        magic, size, header_size, data_offset = RARC_HEADER.unpack_from(buffer)[:4]
+        RARC_HEADER.pack_into(buffer, 0, magic, len(buffer), header_size, data_offset,
+                              len(buffer) - data_start, mram_size, aram_size)
+        
+        if compress:
+            return yaz0_compress(buffer)
+        return bytes(buffer)
+
+
+def is_archive(data):
+    magic = bytes(data[:4])
+    if magic == YAZ0MAGIC:
+        return yaz0_decompress(data, 4) == RARCMAGIC
+    return magic == RARCMAGIC
+
+
+# Read a RARC from a path or a bytes-like object
+def load_archive(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return RARC.from_bytes(source)
+    
+    with open(source, "rb") as f:
+        return RARC.from_bytes(f.read())
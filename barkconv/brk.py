@@ -0,0 +1,1104 @@
+import struct 
+import logging
+from array import array
+from functools import lru_cache
+from collections.abc import MutableSequence
+
+from .profiling import profile_phase
+from .sequences import dedup_sequences, pack_sequences
+
+log = logging.getLogger(__name__)
+
+BRKFILEMAGIC = b"J3D1brk1"
+PADDING = b"This is padding data to align"
+
+# TRK1 magic, section size, loop mode, padding, duration, register and constant animation count,
+# register and constant RGBA value counts, 6 section offsets and 8 RGBA data offsets
+TRK1_HEADER = struct.Struct(">4sIBBHHH8H6I8I")
+# Count, offset and tangent type for R, G, B and A, followed by the color index and 3 bytes of padding
+COLORANIM_ENTRY = struct.Struct(">HHHHHHHHHHHHB3s")
+
+def read_uint32(f):
+    return struct.unpack(">I", f.read(4))[0]
+def read_uint16(f):
+    return struct.unpack(">H", f.read(2))[0]
+def read_sint16(f):
+    return struct.unpack(">h", f.read(2))[0]
+def read_uint8(f):
+    return struct.unpack(">B", f.read(1))[0]
+def read_sint8(f):
+    return struct.unpack(">b", f.read(1))[0]
+def read_float(f):
+    return struct.unpack(">f", f.read(4))[0]
+
+
+# Read a 0-terminated string starting at offset from a bytes-like buffer
+def read_cstring(buffer, offset):
+    if isinstance(buffer, memoryview):
+        end = offset
+        while end < len(buffer) and buffer[end] != 0:
+            end += 1
+        if end >= len(buffer):
+            end = -1
+    else:
+        end = buffer.find(b"\x00", offset)
+    
+    if end == -1:
+        raise RuntimeError("String at 0x{0:x} isn't terminated before the end of the file".format(offset))
+    return bytes(buffer[offset:end])
+
+
+# Errors that reading a broken BRK runs into, they are raised as RuntimeError instead
+_READ_ERRORS = (struct.error, IndexError, UnicodeDecodeError)
+
+
+def _broken_brk(err):
+    return RuntimeError("Broken BRK, {0}: {1}".format(type(err).__name__, err))
+
+
+def write_uint32(f, val):
+    f.write(struct.pack(">I", val))
+def write_uint16(f, val):
+    f.write(struct.pack(">H", val))
+def write_sint16(f, val):
+    f.write(struct.pack(">h", val))
+def write_uint8(f, val):
+    f.write(struct.pack(">B", val))
+def write_sint8(f, val):
+    f.write(struct.pack(">b", val))
+def write_float(f, val):
+    f.write(struct.pack(">f", val))
+
+
+def align(pos, multiple):
+    return (pos + (multiple - 1)) & ~(multiple - 1)
+
+
+def padding_bytes(length):
+    return (PADDING * (length // len(PADDING) + 1))[:length]
+
+
+def write_padding(f, multiple):
+    f.write(padding_bytes(align(f.tell(), multiple) - f.tell()))
+
+
+# Optional rounding
+def opt_round(val, digits):
+    if digits is None:
+        return val
+    else:
+        return round(val, digits)
+
+
+def write_indented(f, text, level):
+    f.write(" "*level)
+    f.write(text)
+    f.write("\n")
+
+
+@lru_cache(maxsize=4096)
+def _hash_string(string):
+    hash = 0
+    
+    for char in string:
+        hash *= 3 
+        hash += ord(char)
+        hash = 0xFFFF & hash  # cast to short 
+    
+    return hash
+
+
+class StringTable(object):
+    def __init__(self):
+        self.strings = []
+        self.hashes = [] # Hashes as stored in the file, empty if the table wasn't read from a file
+        self._hash_index = None
+    
+    # Reads the rest of the file in one go
+    @classmethod
+    def from_file(cls, f):
+        return cls.from_bytes(f.read())
+    
+    @classmethod
+    def from_bytes(cls, buffer, offset=0):
+        stringtable = cls()
+        
+        string_count = struct.unpack_from(">H", buffer, offset)[0]
+        log.debug("string count %d", string_count)
+        
+        entries = struct.unpack_from(">{0}H".format(string_count*2), buffer, offset+4)
+        
+        stringtable.hashes = list(entries[0::2])
+        for string_offset in entries[1::2]:
+            stringtable.strings.append(read_cstring(buffer, offset+string_offset).decode("shift-jis"))
+        
+        return stringtable
+            
+    def hash_string(self, string):
+        return _hash_string(string)
+    
+    # Map of hash to the indices of all strings with that hash. The hashes are computed from
+    # the strings and not taken from the file, where they can be wrong. The map is rebuilt if
+    # the number of strings changes, call reindex() after changing a string.
+    def hash_index(self):
+        if self._hash_index is None or self._hash_index[0] != len(self.strings):
+            index = {}
+            for i, string in enumerate(self.strings):
+                hash = self.hash_string(string)
+                if hash in index:
+                    index[hash].append(i)
+                else:
+                    index[hash] = [i]
+            
+            self._hash_index = (len(self.strings), index)
+        
+        return self._hash_index[1]
+    
+    def reindex(self):
+        self.hashes = []
+        self._hash_index = None
+    
+    # Indices of all occurrences of string in the table
+    def find(self, string):
+        return [i for i in self.hash_index().get(self.hash_string(string), ()) if self.strings[i] == string]
+    
+    def write(self, f):
+        f.write(self.to_bytes())
+    
+    def to_bytes(self):
+        encoded = [string.encode("shift-jis") + b"\x00" for string in self.strings]
+        
+        header = bytearray(4 + 4*len(self.strings))
+        struct.pack_into(">HH", header, 0, len(self.strings), 0xFFFF)
+        
+        offset = len(header)
+        for i, string in enumerate(self.strings):
+            struct.pack_into(">HH", header, 4 + i*4, self.hash_string(string), offset)
+            offset += len(encoded[i])
+        
+        return bytes(header) + b"".join(encoded)
+        
+class AnimComponent(object):
+    __slots__ = ("time", "value", "tangentIn", "tangentOut")
+    
+    def __init__(self, time, value, tangentIn, tangentOut=None):
+        self.time = time 
+        self.value = value
+        self.tangentIn = tangentIn 
+        
+        if tangentOut is None:
+            self.tangentOut = tangentIn
+        else:
+            self.tangentOut = tangentOut
+    
+    def serialize(self):
+        return [self.time, self.value, self.tangentIn, self.tangentOut]
+    
+    def __repr__(self):
+        return "Time: {0}, Val: {1}, TanIn: {2}, TanOut: {3}".format(self.time, self.value, self.tangentIn, self.tangentOut).__repr__()
+        
+    @classmethod
+    def from_array(cls, offset, index, count, valarray, tanType):
+        if count == 1:
+            return cls(0, valarray[offset+index], 0, 0)
+            
+        
+        else:
+            if tanType == 0:
+                return cls(valarray[offset + index*3], valarray[offset + index*3 + 1], valarray[offset + index*3 + 2])
+            elif tanType == 1:
+                return cls(valarray[offset + index*4], valarray[offset + index*4 + 1], valarray[offset + index*4 + 2], valarray[offset + index*4 + 3])
+            else:
+                raise RuntimeError("unknown tangent type: {0}".format(tanType))
+
+
+def _column_property(name):
+    def get(self):
+        return getattr(self._track, name)[self._index]
+    
+    def set(self, val):
+        getattr(self._track, name)[self._index] = val
+    
+    return property(get, set)
+
+
+# An AnimComponent that reads and writes a keyframe stored in an AnimTrack
+class KeyframeView(AnimComponent):
+    __slots__ = ("_track", "_index")
+    
+    def __init__(self, track, index):
+        self._track = track 
+        self._index = index 
+    
+    time = _column_property("time")
+    value = _column_property("value")
+    tangentIn = _column_property("tangentIn")
+    tangentOut = _column_property("tangentOut")
+
+
+# The keyframes of one color component, stored as one array of signed 16 bit values 
+# per keyframe field. Behaves like a list of AnimComponents: indexing and iterating 
+# gives KeyframeViews and AnimComponents can be appended or assigned.
+class AnimTrack(MutableSequence):
+    __slots__ = ("time", "value", "tangentIn", "tangentOut")
+    
+    def __init__(self, components=()):
+        self.time = array("h")
+        self.value = array("h")
+        self.tangentIn = array("h")
+        self.tangentOut = array("h")
+        
+        for animcomp in components:
+            self.append(animcomp)
+    
+    @classmethod
+    def from_array(cls, offset, count, valarray, tanType):
+        track = cls()
+        
+        if count == 1:
+            if offset >= len(valarray):
+                raise RuntimeError("{0} keyframes starting at {1} don't fit in value table of size {2}".format(
+                    count, offset, len(valarray)))
+            track.add(0, valarray[offset], 0, 0)
+        elif count > 1:
+            if tanType == 0:
+                end = offset + count*3
+                track.time = array("h", valarray[offset:end:3])
+                track.value = array("h", valarray[offset+1:end:3])
+                track.tangentIn = array("h", valarray[offset+2:end:3])
+                track.tangentOut = array("h", track.tangentIn)
+            elif tanType == 1:
+                end = offset + count*4
+                track.time = array("h", valarray[offset:end:4])
+                track.value = array("h", valarray[offset+1:end:4])
+                track.tangentIn = array("h", valarray[offset+2:end:4])
+                track.tangentOut = array("h", valarray[offset+3:end:4])
+            else:
+                raise RuntimeError("unknown tangent type: {0}".format(tanType))
+            
+            if len(track.tangentOut) != count:
+                raise RuntimeError("{0} keyframes starting at {1} don't fit in value table of size {2}".format(
+                    count, offset, len(valarray)))
+        
+        return track
+    
+    def add(self, time, value, tangentIn, tangentOut=None):
+        if tangentOut is None:
+            tangentOut = tangentIn
+        
+        try:
+            self.time.append(time)
+            self.value.append(value)
+            self.tangentIn.append(tangentIn)
+            self.tangentOut.append(tangentOut)
+        except (TypeError, OverflowError):
+            del self.time[len(self.tangentOut):]
+            del self.value[len(self.tangentOut):]
+            del self.tangentIn[len(self.tangentOut):]
+            raise RuntimeError("Keyframe values need to be integers from -32768 to 32767: {0}".format(
+                [time, value, tangentIn, tangentOut]))
+    
+    # Tangent type 0 stores only one tangent per keyframe and can be used
+    # if the ingoing and outgoing tangents of every keyframe are the same
+    def tangent_type(self, compact_tangents=False):
+        if compact_tangents and len(self) > 1 and self.tangentIn == self.tangentOut:
+            return 0
+        return 1
+    
+    # The values of the keyframes as they are stored in a value table
+    def to_sequence(self, tangent_type=1):
+        if len(self) == 1:
+            return [self.value[0]]
+        elif tangent_type == 0:
+            sequence = [0]*(len(self)*3)
+            sequence[0::3] = self.time
+            sequence[1::3] = self.value
+            sequence[2::3] = self.tangentIn
+        else:
+            sequence = [0]*(len(self)*4)
+            sequence[0::4] = self.time
+            sequence[1::4] = self.value
+            sequence[2::4] = self.tangentIn
+            sequence[3::4] = self.tangentOut
+        
+        return sequence
+    
+    # Copy with its own arrays
+    def copy(self):
+        track = AnimTrack()
+        track.time = self.time[:]
+        track.value = self.value[:]
+        track.tangentIn = self.tangentIn[:]
+        track.tangentOut = self.tangentOut[:]
+        return track 
+    
+    # (time, value, tangentIn, tangentOut) of every keyframe
+    def rows(self):
+        return zip(self.time, self.value, self.tangentIn, self.tangentOut)
+    
+    def __len__(self):
+        return len(self.time)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [KeyframeView(self, i) for i in range(*index.indices(len(self)))]
+        
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("keyframe index out of range")
+        
+        return KeyframeView(self, index)
+    
+    # Values of a keyframe, checked before any of the columns is changed so that
+    # a bad value can't leave them with different lengths or half of a keyframe
+    @staticmethod
+    def _checked_values(animcomp):
+        values = [animcomp.time, animcomp.value, animcomp.tangentIn, animcomp.tangentOut]
+        try:
+            array("h", values)
+        except (TypeError, OverflowError):
+            raise RuntimeError("Keyframe values need to be integers from -32768 to 32767: {0}".format(values))
+        return values
+    
+    def __setitem__(self, index, animcomp):
+        if isinstance(index, slice):
+            raise TypeError("slice assignment is not supported")
+        
+        time, value, tangentIn, tangentOut = self._checked_values(animcomp)
+        self.time[index] = time
+        self.value[index] = value
+        self.tangentIn[index] = tangentIn
+        self.tangentOut[index] = tangentOut
+    
+    def __delitem__(self, index):
+        del self.time[index]
+        del self.value[index]
+        del self.tangentIn[index]
+        del self.tangentOut[index]
+    
+    def insert(self, index, animcomp):
+        time, value, tangentIn, tangentOut = self._checked_values(animcomp)
+        self.time.insert(index, time)
+        self.value.insert(index, value)
+        self.tangentIn.insert(index, tangentIn)
+        self.tangentOut.insert(index, tangentOut)
+    
+    def append(self, animcomp):
+        self.add(animcomp.time, animcomp.value, animcomp.tangentIn, animcomp.tangentOut)
+    
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ColorAnimation(object):
+    def __init__(self, index, name, colornum=0):
+        self._index = index 
+        #self.matindex = matindex 
+        self.name = name 
+        self.colornum = colornum 
+        
+        self.component = {"R": AnimTrack(), "G": AnimTrack(), "B": AnimTrack(), "A": AnimTrack()}
+        
+        self._component_offsets = {}
+        self._tangent_type = {"R": 1, "G": 1, "B": 1, "A": 1}
+    
+    def add_component(self, colorcomp, animcomp):
+        self.component[colorcomp].append(animcomp)
+    
+    # Copy that doesn't share keyframes with this animation
+    def copy(self):
+        anim = ColorAnimation(self._index, self.name, self.colornum)
+        for comp, track in self.component.items():
+            if not isinstance(track, AnimTrack):
+                track = AnimTrack(track)
+            anim.component[comp] = track.copy()
+        return anim 
+    
+    @classmethod
+    def from_brk(cls, f, name, index, rgba_arrays):
+        entry = COLORANIM_ENTRY.unpack(f.read(COLORANIM_ENTRY.size))
+        return cls.from_entry(entry, name, index, rgba_arrays)
+    
+    @classmethod
+    def from_entry(cls, entry, name, index, rgba_arrays):
+        coloranim = cls(name, index)
+        
+        for i, comp in enumerate(("R", "G", "B", "A")):
+            count, offset, tangent_type = entry[i*3:i*3+3]
+            coloranim.component[comp] = AnimTrack.from_array(offset, count, rgba_arrays[i], tangent_type)
+        
+        coloranim.colornum = entry[12]
+        if entry[13] != b"\xFF\xFF\xFF":
+            raise RuntimeError("Unexpected padding in color animation entry: {0}".format(entry[13]))
+        
+        return coloranim
+        
+    # These functions are used for keeping track of the offset
+    # in the json->brk conversion and are otherwise not useful.
+    def _set_component_offsets(self, colorcomp, val):
+        self._component_offsets[colorcomp] = val
+    
+    def _set_tangent_type(self, colorcomp, val):
+        self._tangent_type[colorcomp] = val
+
+
+# The animations of one type in a BRK, decoded from the buffer when they are first accessed.
+# For each animation only the part of the value tables it uses is read. Decoded animations are 
+# kept, and the list can be changed like any other list.
+class LazyAnimationList(MutableSequence):
+    # tables is (offset, value count) of the R, G, B and A value tables
+    def __init__(self, buffer, entry_offset, count, names, tables):
+        self._buffer = buffer 
+        self._entry_offset = entry_offset 
+        self._tables = tables
+        self._entries = list(range(count)) # Index of the entry in the BRK for animations that weren't decoded yet
+        self._items = [None]*count
+        self._names = list(names)
+    
+    def _load(self, index):
+        anim = self._items[index]
+        
+        if anim is None:
+            try:
+                anim = self._decode(index)
+            except _READ_ERRORS as err:
+                raise _broken_brk(err)
+            self._items[index] = anim 
+        
+        return anim 
+    
+    # Decode the animation at index from the buffer
+    def _decode(self, index):
+        entry_index = self._entries[index]
+        entry = list(COLORANIM_ENTRY.unpack_from(self._buffer, self._entry_offset + COLORANIM_ENTRY.size*entry_index))
+        
+        rgba_arrays = []
+        for i, (table_offset, table_count) in enumerate(self._tables):
+            count, offset, tangent_type = entry[i*3:i*3+3]
+            
+            if count == 1:
+                value_count = 1 
+            elif tangent_type == 0:
+                value_count = count*3
+            else:
+                value_count = count*4
+            
+            if count > 0 and offset + value_count > table_count:
+                raise RuntimeError("{0} keyframes starting at {1} don't fit in value table of size {2}".format(
+                    count, offset, table_count))
+            
+            if count == 0:
+                rgba_arrays.append(())
+            else:
+                rgba_arrays.append(struct.unpack_from(">{0}h".format(value_count), self._buffer, table_offset + offset*2))
+            entry[i*3+1] = 0
+        
+        return ColorAnimation.from_entry(entry, entry_index, self._names[index], rgba_arrays)
+    
+    # Material name of an animation without decoding it
+    def name(self, index):
+        if self._items[index] is not None:
+            return self._items[index].name 
+        return self._names[index]
+    
+    def is_loaded(self, index):
+        return self._items[index] is not None
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(i) for i in range(*index.indices(len(self)))]
+        
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("animation index out of range")
+        
+        return self._load(index)
+    
+    def __setitem__(self, index, anim):
+        if isinstance(index, slice):
+            raise TypeError("slice assignment is not supported")
+        
+        self._items[index] = anim 
+        self._names[index] = anim.name 
+    
+    def __delitem__(self, index):
+        del self._items[index]
+        del self._names[index]
+        del self._entries[index]
+    
+    def insert(self, index, anim):
+        self._items.insert(index, anim)
+        self._names.insert(index, anim.name)
+        self._entries.insert(index, None)
+    
+    def __repr__(self):
+        return repr(list(self))
+
+
+class BRKAnim(object):
+    def __init__(self, loop_mode, duration):
+        self.register_animations = []
+        self.constant_animations = []
+        self.loop_mode = loop_mode
+        #self.anglescale = anglescale
+        self.duration = duration
+        #self.unknown_address = unknown_address
+        
+        # String tables of material names for looking up animations by name
+        self._stringtables = {}
+    
+    # Colors of all animations of a type ("register" or "constant") for every frame from 0 to duration,
+    # see bake_colors. The color of animation i at frame j starts at index (i*(duration+1) + j)*4.
+    def bake(self, animtype="register"):
+        from .evaluate import bake_colors
+        
+        if animtype == "register":
+            return bake_colors(self.register_animations, self.duration+1)
+        elif animtype == "constant":
+            return bake_colors(self.constant_animations, self.duration+1)
+        else:
+            raise RuntimeError("unknown animation type: {0}".format(animtype))
+    
+    # RGBA of one of the animations at a frame, following the loop mode of the BRK
+    def sample(self, anim, frame):
+        from .evaluate import sample
+        
+        return sample(anim, frame, self.loop_mode, self.duration)
+    
+    # SampleCursor for playing one of the animations with the loop mode of the BRK
+    def cursor(self, anim):
+        from .evaluate import SampleCursor
+        
+        return SampleCursor(anim, self.loop_mode, self.duration)
+    
+    # Remove keyframes while keeping the rounded colors at every frame within tolerance,
+    # see simplify_track. Returns the number of keyframes before and after.
+    def simplify(self, tolerance=0):
+        from .simplify import simplify_brk
+        
+        return simplify_brk(self, tolerance)
+    
+    # Hash of the animations that doesn't depend on how they are stored, see brk_fingerprint
+    def fingerprint(self):
+        from .fingerprint import brk_fingerprint
+        
+        return brk_fingerprint(self)
+    
+    # New BRK with only the animations of the given material names, see extract_materials
+    def extract(self, names):
+        from .merge import extract_materials
+        
+        return extract_materials(self, names)
+    
+    # Combine the animations of several BRKs, see merge_brks
+    @classmethod
+    def merge(cls, brks, on_duplicate="last"):
+        from .merge import merge_brks
+        
+        return merge_brks(brks, on_duplicate)
+    
+    # Material names of all animations of a type ("register" or "constant"). 
+    # Doesn't decode the animations of a lazily loaded BRK.
+    def material_names(self, animtype="register"):
+        if animtype == "register":
+            animations = self.register_animations
+        elif animtype == "constant":
+            animations = self.constant_animations
+        else:
+            raise RuntimeError("unknown animation type: {0}".format(animtype))
+        
+        if isinstance(animations, LazyAnimationList):
+            return [animations.name(i) for i in range(len(animations))]
+        return [anim.name for anim in animations]
+    
+    # All animations of a type ("register" or "constant") for the material name. A material
+    # can have animations for more than one color. 
+    def find_animations(self, name, animtype="register"):
+        if animtype == "register":
+            animations = self.register_animations
+        elif animtype == "constant":
+            animations = self.constant_animations
+        else:
+            raise RuntimeError("unknown animation type: {0}".format(animtype))
+        
+        stringtable = self._stringtables.get(animtype)
+        if stringtable is None or len(stringtable.strings) != len(animations):
+            stringtable = StringTable()
+            stringtable.strings = self.material_names(animtype)
+            self._stringtables[animtype] = stringtable
+        
+        return [animations[i] for i in stringtable.find(name) if animations[i].name == name]
+    
+    # Has to be called after renaming animations so that find_animations sees the new names
+    def reindex(self):
+        self._stringtables = {}
+    
+    # Writes the animation as json. The text of each animation is built in one go and written 
+    # with a single write. With compact, no whitespace is added. With digits, all keyframe values 
+    # are rounded to that many digits.
+    def dump(self, f, digits=None, compact=False):
+        with profile_phase("emit"):
+            self._dump(f, digits, compact)
+    
+    def _dump(self, f, digits, compact):
+        if compact:
+            colon, sep, newline = ":", ",", ""
+        else:
+            colon, sep, newline = ": ", ", ", "\n"
+        
+        def line(text, level):
+            if compact:
+                return text
+            return " "*level + text + "\n"
+        
+        row_format = "[{0}" + sep + "{1}" + sep + "{2}" + sep + "{3}]"
+        row_start = "" if compact else " "*16
+        row_separator = "," + newline + row_start
+        
+        header = [
+            line("{", 0),
+            line("\"loop_mode\"{0}{1},".format(colon, self.loop_mode), 4),
+            #line("\"angle_scale\"{0}{1},".format(colon, self.anglescale), 4),
+            line("\"duration\"{0}{1},".format(colon, self.duration), 4),
+            #line("\"unknown\"{0}\"0x{1:x}\",".format(colon, self.unknown_address), 4),
+        ]
+        if not compact:
+            header.append(line("", 4))
+        f.write("".join(header))
+        
+        for animtype, animations in (
+            ("register", self.register_animations), 
+            ("constant", self.constant_animations)
+            ):
+            f.write(line("\"{0}_color_animations\"{1}[".format(animtype, colon), 4))
+            
+            for i, animation in enumerate(animations):
+                text = [
+                    line("{", 8),
+                    line("\"material_name\"{0}\"{1}\",".format(colon, animation.name), 12)
+                ]
+                
+                if animtype == "register":
+                    text.append(line("\"tevcolor\"{0}{1},".format(colon, animation.colornum), 12))
+                else:
+                    text.append(line("\"konstcolor\"{0}{1},".format(colon, animation.colornum), 12))
+                
+                if not compact:
+                    text.append(line("", 12))
+                
+                for component_name in ("red", "green", "blue", "alpha"):
+                    comp = component_name[0].upper()
+                    text.append(line("\"{0}\"{1}[".format(component_name, colon), 12))
+                    
+                    track = animation.component[comp]
+                    if isinstance(track, AnimTrack):
+                        # Values in a track are always integers, rounding doesn't change them
+                        rows = [row_format.format(*row) for row in track.rows()]
+                    elif digits is None:
+                        rows = [row_format.format(*animcomp.serialize()) for animcomp in track]
+                    else:
+                        rows = [row_format.format(*(opt_round(val, digits) for val in animcomp.serialize())) 
+                                for animcomp in track]
+                    
+                    if rows:
+                        text.append(row_start + row_separator.join(rows) + newline)
+                    
+                    if component_name != "alpha":
+                        text.append(line("],", 12))
+                    else:
+                        text.append(line("]", 12))
+                    
+                if i < len(animations)-1:
+                    text.append(line("},", 8))
+                else:
+                    text.append(line("}", 8))
+                
+                f.write("".join(text))
+                
+            if animtype != "constant":
+                f.write(line("],", 4))
+            else:
+                f.write(line("]", 4))
+        f.write(line("}", 0))
+    
+    def write_brk(self, f, packing="dedup", compact_tangents=False):
+        f.write(self.to_bytes(packing, compact_tangents))
+    
+    # Header and animation fields whose values don't fit in their field in a BRK, as a list
+    # of (field name, message). Field names are the ones used in json files.
+    def range_errors(self):
+        errors = []
+        for field, value, bits in (("loop_mode", self.loop_mode, 8), ("duration", self.duration, 16)):
+            if not 0 <= value < 1 << bits:
+                errors.append((field, "{0} {1} doesn't fit in a BRK, it has to be from 0 to {2}".format(field, value, (1 << bits) - 1)))
+        
+        for animtype, field, animations in (("register", "tevcolor", self.register_animations),
+                                            ("constant", "konstcolor", self.constant_animations)):
+            for i, anim in enumerate(animations):
+                if not 0 <= anim.colornum <= 0xFF:
+                    errors.append((field, "{0} of {1} animation {2} ({3}) is {4}, it has to be from 0 to 255".format(
+                        field, animtype, i, anim.name, anim.colornum)))
+        
+        return errors
+    
+    # Combine the keyframe sequences of all animations into one value table
+    # per animation type and color component. The offset of each sequence is 
+    # stored on the animation. With compact_tangents, keyframes are stored with tangent type 0
+    # wherever possible.
+    def _build_value_tables(self, packing="dedup", compact_tangents=False):
+        all_values = {}
+        
+        for animtype, animations in (
+        ("register", self.register_animations), 
+        ("constant", self.constant_animations)):
+        
+            all_values[animtype] = {}
+            for colorcomp in ("R", "G", "B", "A"):
+                sequences = []
+                
+                for anim in animations: 
+                    
+                
+                    track = anim.component[colorcomp]
+                    if not isinstance(track, AnimTrack):
+                        track = AnimTrack(track)
+                    
+                    tangent_type = track.tangent_type(compact_tangents)
+                    anim._set_tangent_type(colorcomp, tangent_type)
+                    
+                    sequence = track.to_sequence(tangent_type)
+                    
+                    sequences.append(sequence)
+                
+                if packing == "overlap":
+                    values, offsets = pack_sequences(sequences)
+                elif packing == "dedup":
+                    values, offsets = dedup_sequences(sequences)
+                else:
+                    raise RuntimeError("unknown packing mode: {0}".format(packing))
+                
+                if len(values) > 0xFFFF:
+                    raise RuntimeError("Too many {0} {1} values for a BRK: {2}".format(animtype, colorcomp, len(values)))
+                
+                for anim, offset in zip(animations, offsets):
+                    anim._set_component_offsets(colorcomp, offset)
+                
+                all_values[animtype][colorcomp] = values
+        
+        return all_values
+    
+    # The layout of the whole file is computed first so that everything can be 
+    # packed into a single preallocated buffer without seeking back.
+    def to_bytes(self, packing="dedup", compact_tangents=False):
+        with profile_phase("dedup"):
+            all_values = self._build_value_tables(packing, compact_tangents)
+        
+        with profile_phase("emit"):
+            return self._pack(all_values)
+    
+    def _pack(self, all_values):
+        errors = self.range_errors()
+        if errors:
+            raise RuntimeError(errors[0][1])
+        
+        # Create string tables of material names for register and constant color animations
+        register_stringtable = StringTable()
+        for anim in self.register_animations:
+            register_stringtable.strings.append(anim.name)
+        
+        constant_stringtable = StringTable()
+        for anim in self.constant_animations:
+            constant_stringtable.strings.append(anim.name)
+        
+        register_stringtable_data = register_stringtable.to_bytes()
+        constant_stringtable_data = constant_stringtable.to_bytes()
+        
+        # (start, end) of every stretch of padding
+        paddings = []
+        
+        trk1_start = 0x20
+        pos = trk1_start + TRK1_HEADER.size
+        paddings.append((pos, align(pos, 32)))
+        pos = align(pos, 32)
+        assert pos == 0x80
+        
+        register_anim_start = pos
+        pos += COLORANIM_ENTRY.size*len(self.register_animations)
+        paddings.append((pos, align(pos, 4)))
+        pos = align(pos, 4)
+        
+        constant_anim_start = pos
+        pos += COLORANIM_ENTRY.size*len(self.constant_animations)
+        paddings.append((pos, align(pos, 4)))
+        pos = align(pos, 4)
+        
+        data_starts = []
+        for animtype in ("register", "constant"):
+            for comp in ("R", "G", "B", "A"):
+                data_starts.append(pos)
+                pos += 2*len(all_values[animtype][comp])
+                paddings.append((pos, align(pos, 4)))
+                pos = align(pos, 4)
+        
+        register_index_start = pos
+        pos += 2*len(self.register_animations)
+        paddings.append((pos, align(pos, 4)))
+        pos = align(pos, 4)
+        
+        constant_index_start = pos
+        pos += 2*len(self.constant_animations)
+        paddings.append((pos, align(pos, 4)))
+        pos = align(pos, 4)
+        
+        register_stringtable_start = pos
+        pos += len(register_stringtable_data)
+        paddings.append((pos, align(pos, 4)))
+        pos = align(pos, 4)
+        
+        constant_stringtable_start = pos
+        pos += len(constant_stringtable_data)
+        paddings.append((pos, align(pos, 4)))
+        pos = align(pos, 4)
+        
+        paddings.append((pos, align(pos, 32)))
+        total_size = align(pos, 32)
+        
+        # Kept for patching the file later, see IncrementalEncoder
+        self._layout = {
+            "animations": {"register": register_anim_start, "constant": constant_anim_start},
+            "values": dict(zip(
+                [(animtype, comp) for animtype in ("register", "constant") for comp in ("R", "G", "B", "A")], 
+                data_starts))
+        }
+        
+        buffer = bytearray(total_size)
+        
+        for start, end in paddings:
+            buffer[start:end] = padding_bytes(end-start)
+        
+        struct.pack_into(">8sII16s", buffer, 0, BRKFILEMAGIC, total_size, 1, b"SVR1" + b"\xFF"*12) # Always a section count of 1
+        
+        counts = []
+        for animtype in ("register", "constant"):
+            for comp in ("R", "G", "B", "A"):
+                counts.append(len(all_values[animtype][comp]))
+        
+        TRK1_HEADER.pack_into(buffer, trk1_start, 
+            b"TRK1", total_size - trk1_start, self.loop_mode, 0xFF, self.duration,
+            len(self.register_animations), len(self.constant_animations), 
+            *counts,
+            register_anim_start        - trk1_start,
+            constant_anim_start        - trk1_start,
+            register_index_start       - trk1_start,
+            constant_index_start       - trk1_start,
+            register_stringtable_start - trk1_start,
+            constant_stringtable_start - trk1_start,
+            *(data_start - trk1_start for data_start in data_starts))
+        
+        for anim_start, animations in ((register_anim_start, self.register_animations), 
+                                       (constant_anim_start, self.constant_animations)):
+            for i, anim in enumerate(animations):
+                entry = []
+                for comp in ("R", "G", "B", "A"):
+                    entry.append(len(anim.component[comp])) # Scale count for this animation
+                    entry.append(anim._component_offsets[comp]) # Offset into scales
+                    entry.append(anim._tangent_type[comp]) # Tangent type, 0 = only TangentIn; 1 = TangentIn and TangentOut
+                
+                COLORANIM_ENTRY.pack_into(buffer, anim_start + COLORANIM_ENTRY.size*i, *entry, anim.colornum, b"\xFF\xFF\xFF")
+        
+        i = 0
+        for animtype in ("register", "constant"):
+            for comp in ("R", "G", "B", "A"):
+                values = all_values[animtype][comp]
+                struct.pack_into(">{0}h".format(len(values)), buffer, data_starts[i], *values)
+                i += 1
+        
+        # Write the indices for each animation
+        struct.pack_into(">{0}H".format(len(self.register_animations)), buffer, register_index_start, 
+                         *range(len(self.register_animations)))
+        struct.pack_into(">{0}H".format(len(self.constant_animations)), buffer, constant_index_start, 
+                         *range(len(self.constant_animations)))
+        
+        buffer[register_stringtable_start:register_stringtable_start+len(register_stringtable_data)] = register_stringtable_data
+        buffer[constant_stringtable_start:constant_stringtable_start+len(constant_stringtable_data)] = constant_stringtable_data
+        
+        return buffer
+    
+    @classmethod
+    def from_json(cls, f):
+        import json
+        
+        with profile_phase("parse json"):
+            brkanimdata = json.load(f)
+        
+        brk = cls(
+            brkanimdata["loop_mode"],
+            brkanimdata["duration"]
+        )
+        
+        for i, animation in enumerate(brkanimdata["register_color_animations"]):
+            if "unknown" in animation:
+                # Backwards compatibility
+                tev_number = animation["unknown"]
+            else:
+                tev_number = animation["tevcolor"]
+                
+            coloranim = ColorAnimation(
+                i, 
+                animation["material_name"], 
+                tev_number)
+            
+            for compname in ("red", "green", "blue", "alpha"):
+                comp = compname[0].upper()
+                
+                for colorcomp in animation[compname]:
+                    coloranim.component[comp].add(*colorcomp)
+            
+            brk.register_animations.append(coloranim)
+        
+        for i, animation in enumerate(brkanimdata["constant_color_animations"]):
+            if "unknown" in animation:
+                # Backwards compatibility
+                constant_number = animation["unknown"]
+            else:
+                constant_number = animation["konstcolor"]
+                
+            coloranim = ColorAnimation(
+                i, 
+                animation["material_name"], 
+                constant_number)
+            
+            for compname in ("red", "green", "blue", "alpha"):
+                comp = compname[0].upper()
+                
+                for colorcomp in animation[compname]:
+                    coloranim.component[comp].add(*colorcomp)
+            
+            brk.constant_animations.append(coloranim)
+        
+        return brk
+    
+    @classmethod
+    def from_brk(cls, f, lazy=False):
+        return cls.from_bytes(f.read(), lazy)
+    
+    @classmethod
+    def from_bytes(cls, buffer, lazy=False):
+        # buffer can be bytes, bytearray, a memoryview or an mmap. All values are read 
+        # with unpack_from at offsets relative to the start of the TRK1 section.
+        # With lazy, only the header and the string tables are read and the animations are 
+        # decoded when they are first accessed (see LazyAnimationList). The buffer needs to 
+        # stay valid for as long as animations can be accessed.
+        # A broken BRK raises a RuntimeError, use barkconv.validate to find all of its problems.
+        try:
+            return cls._from_bytes(buffer, lazy)
+        except _READ_ERRORS as err:
+            raise _broken_brk(err)
+    
+    @classmethod
+    def _from_bytes(cls, buffer, lazy):
+        with profile_phase("header"):
+            header = bytes(buffer[0:8])
+            if header != BRKFILEMAGIC:
+                raise RuntimeError("Invalid header. Expected {} but found {}".format(BRKFILEMAGIC, header))
+            
+            size, sectioncount = struct.unpack_from(">II", buffer, 8)
+            log.debug("Size of brk: %d bytes", size)
+            if sectioncount != 1:
+                raise RuntimeError("Expected 1 section in BRK but found {0}".format(sectioncount))
+            
+            trk_start = 0x20
+            
+            (trk_magic, trk_sectionsize, loop_mode, padd, duration, 
+                register_color_anim_count, constant_color_anim_count, 
+                *fields) = TRK1_HEADER.unpack_from(buffer, trk_start)
+            if padd != 0xFF:
+                raise RuntimeError("Unexpected padding in TRK1 header: 0x{0:02x}".format(padd))
+            brk = cls(loop_mode, duration)
+            
+            log.debug("%d register color anims and %d constant color anims", register_color_anim_count, constant_color_anim_count)
+            component_counts = {}
+            offsets = {}
+            for i, animtype in enumerate(("register", "constant")):
+                component_counts[animtype] = {}
+                offsets[animtype] = {}
+                
+                for j, comp in enumerate(("R", "G", "B", "A")):
+                    component_counts[animtype][comp] = fields[i*4 + j]
+                    offsets[animtype][comp] = fields[8 + 6 + i*4 + j] + trk_start 
+                    log.debug("%s %s count: %d offset: 0x%x", animtype, comp, component_counts[animtype][comp], offsets[animtype][comp])
+            
+            (register_color_animation_offset, constant_color_animation_offset,
+                register_index_offset, constant_index_offset,
+                register_stringtable_offset, constant_stringtable_offset) = (offset + trk_start for offset in fields[8:14])
+        
+            log.debug("register index offset: 0x%x", register_index_offset)
+            # Read indices
+            register_indices = struct.unpack_from(">{0}H".format(register_color_anim_count), buffer, register_index_offset)
+            for i, index in enumerate(register_indices):
+                if i != index:
+                    raise RuntimeError("register index mismatch: {0} {1}".format(i, index))
+            
+            constant_indices = struct.unpack_from(">{0}H".format(constant_color_anim_count), buffer, constant_index_offset)
+            for i, index in enumerate(constant_indices):
+                if i != index:
+                    raise RuntimeError("constant index mismatch: {0} {1}".format(i, index))
+        
+        # Read stringtable 
+        with profile_phase("string tables"):
+            register_stringtable = StringTable.from_bytes(buffer, register_stringtable_offset)
+            constant_stringtable = StringTable.from_bytes(buffer, constant_stringtable_offset)
+            
+            for animtype, stringtable, anim_count in (
+                    ("register", register_stringtable, register_color_anim_count),
+                    ("constant", constant_stringtable, constant_color_anim_count)):
+                if len(stringtable.strings) < anim_count:
+                    raise RuntimeError("{0} string table has only {1} names for {2} animations".format(
+                        animtype, len(stringtable.strings), anim_count))
+            brk._stringtables = {"register": register_stringtable, "constant": constant_stringtable}
+        
+        if lazy:
+            for animtype, anim_count, anim_offset, stringtable in (
+                    ("register", register_color_anim_count, register_color_animation_offset, register_stringtable),
+                    ("constant", constant_color_anim_count, constant_color_animation_offset, constant_stringtable)):
+                
+                tables = [(offsets[animtype][comp], component_counts[animtype][comp]) for comp in ("R", "G", "B", "A")]
+                animations = LazyAnimationList(buffer, anim_offset, anim_count, stringtable.strings, tables)
+                
+                if animtype == "register":
+                    brk.register_animations = animations
+                else:
+                    brk.constant_animations = animations
+            
+            return brk
+        
+        # read RGBA values 
+        with profile_phase("value tables"):
+            values = {}
+            for animtype in ("register", "constant"):
+                values[animtype] = {}
+                
+                for comp in ("R", "G", "B", "A"):
+                    count = component_counts[animtype][comp]
+                    values[animtype][comp] = struct.unpack_from(">{0}h".format(count), buffer, offsets[animtype][comp])
+        
+        with profile_phase("animation entries"):
+            for animtype, anim_count, anim_offset, stringtable, animations in (
+                    ("register", register_color_anim_count, register_color_animation_offset, 
+                        register_stringtable, brk.register_animations),
+                    ("constant", constant_color_anim_count, constant_color_animation_offset, 
+                        constant_stringtable, brk.constant_animations)):
+                
+                rgba_arrays = (values[animtype]["R"], values[animtype]["G"], values[animtype]["B"], values[animtype]["A"])
+                
+                for i in range(anim_count):
+                    entry = COLORANIM_ENTRY.unpack_from(buffer, anim_offset + COLORANIM_ENTRY.size*i)
+                    name = stringtable.strings[i]
+                    animations.append(ColorAnimation.from_entry(entry, i, name, rgba_arrays))
+        
+        return brk 
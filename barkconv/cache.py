@@ -0,0 +1,102 @@
+import os
+
+# Bump when a change to the converter changes its output, so that old cache entries aren't used
+CACHE_VERSION = b"1"
+# Eviction removes entries until the cache is this fraction of max_size, so that it doesn't
+# have to go through all entries again on the next write
+LOW_WATER = 0.8
+
+
+# On-disk cache of conversion results, keyed by a hash of the input and the conversion options.
+# When the total size of the cache goes over max_size bytes, the least recently used 
+# entries are removed until it is down to LOW_WATER of max_size. The cache can be shared 
+# by several processes.
+class ConversionCache(object):
+    def __init__(self, directory, max_size=256*1024*1024):
+        self.directory = directory 
+        self.max_size = max_size 
+        self._size = None # Estimate of the total size, read from disk on the first write
+    
+    def key(self, data, options):
+        import hashlib
+        
+        hash = hashlib.sha256(CACHE_VERSION)
+        hash.update(repr(sorted(options.items())).encode("utf-8"))
+        hash.update(b"\x00")
+        hash.update(data)
+        return hash.hexdigest()
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+    
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None 
+        
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        
+        return data 
+    
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # Writing an entry again replaces it
+        try:
+            old_size = os.stat(path).st_size
+        except OSError:
+            old_size = 0
+        
+        temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        
+        if self._size is None:
+            self._size = sum(size for path, size, mtime in self._entries())
+        else:
+            self._size += len(data) - old_size
+        
+        if self._size > self.max_size:
+            self.evict()
+    
+    def _entries(self):
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue 
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        
+        return entries
+    
+    # Remove the least recently used entries until the cache fits in LOW_WATER of max_size
+    def evict(self):
+        entries = self._entries()
+        entries.sort(key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        target = int(self.max_size*LOW_WATER)
+        
+        for path, entry_size, mtime in entries:
+            if size <= target:
+                break 
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        
+        self._size = size 
@@ -0,0 +1,688 @@
+import argparse
+import logging
+import os
+import sys
+
+from .cache import ConversionCache
+from .convert import convert_batch, convert_file, find_inputs, is_brk_file
+from .profiling import Profiler, set_profiler
+
+log = logging.getLogger(__name__)
+
+
+# Command line interface, argv defaults to sys.argv[1:]
+def main(argv=None, prog=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if prog is None:
+        prog = os.path.basename(sys.argv[0])
+    
+    # Commands are only recognized as the first argument and if there is no file with that name
+    if argv and argv[0] in COMMANDS and not os.path.exists(argv[0]):
+        return COMMANDS[argv[0]](argv[1:], "{0} {1}".format(prog, argv[0]))
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        fromfile_prefix_chars="@",
+        usage=(
+            "%(prog)s [options] input [output]\n"
+            "       %(prog)s [options] --batch input [input ...]\n"
+            "       %(prog)s [options] --recursive DIR [input ...]\n"
+            "       %(prog)s COMMAND ..."
+        ),
+        epilog=(
+            "commands: "
+            "archive (list, extract and replace BRKs in .arc and .szs archives), "
+            "simplify (remove keyframes that aren't needed), "
+            "merge (combine several BRKs into one), "
+            "split (extract materials from a BRK), "
+            "diff (compare the animations of two files), "
+            "fingerprint (hashes of the animations of many files, and comparing them with a baseline), "
+            "validate (check files for problems without converting them), "
+            "verify-roundtrip (check that converting BRKs to json and back gives the same BRKs). "
+            "Run %(prog)s COMMAND -h for the options of a command."
+        ))
+    parser.add_argument("input", nargs="*",
+                        help=(
+                            "Path to brk or json-formatted text file. With --batch or --recursive, any number of files. "
+                            "@listfile reads paths from listfile, one per line."
+                        ))
+    parser.add_argument("output", default=None, nargs = '?',
+                        help=(
+                            "Path to which the converted file should be written. "
+                            "If input was a BRK, writes a json file. If input was a json file, writes a BRK."
+                            "If left out, output defaults to <input>.json or <input>.brk."
+                        ))
+    parser.add_argument("--packing", default="dedup", choices=("dedup", "overlap"),
+                        help=(
+                            "How keyframes are packed into the value tables of a BRK. "
+                            "dedup (default) reuses keyframes that appear whole in the table. "
+                            "overlap also shares keyframes between the end of one animation and the start of another, "
+                            "which usually makes smaller BRKs and never larger ones, but takes longer to write."
+                        ))
+    parser.add_argument("--compact-tangents", action="store_true",
+                        help=(
+                            "Store keyframes without a separate outgoing tangent (tangent type 0) "
+                            "for every color component whose ingoing and outgoing tangents are always the same."
+                        ))
+    parser.add_argument("--compact", action="store_true",
+                        help="Write json without indentation and line breaks.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Show details about the files that are read.")
+    parser.add_argument("--profile", action="store_true",
+                        help=(
+                            "Show the time and the number of allocated memory blocks of every phase of the conversion. "
+                            "Batch conversions are run in a single process with this option."
+                        ))
+    parser.add_argument("--cache", metavar="DIR", default=None,
+                        help=(
+                            "Keep converted files in DIR and reuse them when the same input is converted "
+                            "again with the same options."
+                        ))
+    parser.add_argument("--cache-size", metavar="MB", type=int, default=256,
+                        help="Size limit of the cache in megabytes. Least recently used files are removed first. Default: 256")
+    parser.add_argument("--watch", action="store_true",
+                        help=(
+                            "Keep running and convert the json inputs to BRK again whenever they change. "
+                            "If only keyframe values changed, the previous BRK is patched instead of rebuilt where possible."
+                        ))
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="How often to check for changes in watch mode, in seconds. Default: 0.5")
+    parser.add_argument("--serve", metavar="ADDRESS", default=None,
+                        help=(
+                            "Run as a conversion server instead of converting files. ADDRESS is host:port, "
+                            "the path of a Unix socket or - for json requests on stdin and responses on stdout, one per line."
+                        ))
+    parser.add_argument("--serve-remote", action="store_true",
+                        help=(
+                            "Let --serve listen on a host:port that isn't a loopback address. Clients can read and write "
+                            "any file the server can, so only use this on a network you trust."
+                        ))
+    parser.add_argument("--server", metavar="ADDRESS", default=os.environ.get("BARKCONV_SERVER"),
+                        help=(
+                            "Send the conversions to a server started with --serve. If the server can't be reached, "
+                            "files are converted locally. Defaults to the BARKCONV_SERVER environment variable."
+                        ))
+    parser.add_argument("-b", "--batch", action="store_true",
+                        help=(
+                            "Convert every input to <input>.json or <input>.brk. "
+                            "Implied by --recursive, @listfile or when more than two inputs are given."
+                        ))
+    parser.add_argument("-r", "--recursive", metavar="DIR", action="append", default=[],
+                        help="Convert all brk and json files in DIR and its subdirectories. Can be given more than once.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of processes for batch conversion. Defaults to the number of CPUs.")
+    
+    # input takes all positional arguments, so for a single conversion 
+    # the output is the second entry of args.input. 
+    args = parser.parse_args(argv)
+    
+    options = {"packing": args.packing, "compact_tangents": args.compact_tangents, "compact": args.compact}
+    if args.cache is not None:
+        options["cache"] = ConversionCache(args.cache, args.cache_size*1024*1024)
+    
+    from_listfile = any(arg.startswith("@") for arg in argv)
+    batch = args.batch or args.recursive or from_listfile or len(args.input) > 2
+    
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    elif batch and not args.watch:
+        logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    else:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    if args.profile:
+        profiler = Profiler()
+        set_profiler(profiler)
+        args.jobs = 1
+    
+    client = None
+    if args.server is not None and args.serve is None and not args.watch:
+        from .server import ConversionClient
+        
+        try:
+            client = ConversionClient(args.server)
+        except OSError as err:
+            log.warning("Can't connect to conversion server %s (%s), converting locally", args.server, err)
+    
+    if args.serve is not None:
+        from .server import ConversionServer
+        
+        server = ConversionServer(args.jobs, options.get("cache"))
+        try:
+            if args.serve == "-":
+                server.serve_stdio()
+            else:
+                server.serve(args.serve, args.serve_remote)
+        except RuntimeError as err:
+            parser.error(str(err))
+        finally:
+            server.close()
+        failed = []
+    elif args.watch:
+        if batch:
+            inputs = [input for input in args.input if not is_brk_file(input)]
+            for directory in args.recursive:
+                inputs.extend(input for input in find_inputs(directory) if input.lower().endswith(".json"))
+            outputs = {}
+        elif len(args.input) == 0:
+            parser.error("no input given")
+        else:
+            inputs = args.input[:1]
+            outputs = {}
+            if len(args.input) > 1:
+                outputs[args.input[0]] = args.input[1]
+        
+        from .watch import watch
+        
+        watch(inputs, outputs, args.interval, args.packing, args.compact_tangents)
+        failed = []
+    elif batch:
+        inputs = list(args.input)
+        for directory in args.recursive:
+            inputs.extend(find_inputs(directory))
+        
+        if client is not None:
+            options.pop("cache", None)
+            results = client.convert_files([(input, None) for input in inputs], **options)
+        else:
+            results = convert_batch(inputs, args.jobs, **options)
+        
+        failed = [(input, error) for input, output, error in results if error is not None]
+        for input, error in failed:
+            print("Failed to convert {0}: {1}".format(input, error))
+        print("Converted {0} of {1} files, {2} failed.".format(len(results)-len(failed), len(results), len(failed)))
+    else:
+        if len(args.input) == 0:
+            parser.error("no input given")
+        
+        output = args.input[1] if len(args.input) > 1 else None
+        if client is not None:
+            options.pop("cache", None)
+            input, output, error = client.convert_files([(args.input[0], output)], **options)[0]
+            if error is not None:
+                raise RuntimeError(error)
+        else:
+            convert_file(args.input[0], output, **options)
+        failed = []
+    
+    if client is not None:
+        client.close()
+    
+    if args.profile:
+        print(profiler.report())
+    
+    if failed:
+        sys.exit(1)
+
+
+def _write_atomic(path, data):
+    temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+# Read a BRK or json file
+def _load(path, lazy=False):
+    from .convert import load_brk, load_json
+    
+    if is_brk_file(path):
+        return load_brk(path, lazy)
+    return load_json(path)
+
+
+# Write a BRK, or json if brk_output is False
+def _save(brk, path, brk_output, args):
+    from .convert import dump_json, write_brk
+    
+    if brk_output:
+        write_brk(brk, path, args.packing, args.compact_tangents)
+    else:
+        dump_json(brk, path, compact=args.compact)
+
+
+def _add_output_options(parser):
+    parser.add_argument("--packing", default="dedup", choices=("dedup", "overlap"),
+                        help="How keyframes are packed into the value tables of the BRK, see the main options.")
+    parser.add_argument("--compact-tangents", action="store_true",
+                        help="Store keyframes without a separate outgoing tangent where possible, see the main options.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write json without indentation and line breaks.")
+
+
+# Where a file in an archive goes below directory, or None if its path could lead outside of
+# directory. Archives come from anywhere, so their paths can't be trusted.
+def _archive_member_path(directory, path):
+    parts = [part for part in path.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or any(part == ".." or os.path.isabs(part) or os.path.splitdrive(part)[0] for part in parts):
+        return None
+    return os.path.join(directory, *parts)
+
+
+def archive_main(argv, prog):
+    from .archive import load_archive
+    from .convert import dump_json, load_json
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="List, convert and replace the BRKs in a RARC archive (.arc) or a Yaz0 compressed one (.szs) without extracting them.")
+    actions = parser.add_subparsers(dest="action", metavar="ACTION")
+    actions.required = True
+    
+    list_parser = actions.add_parser("list", help="Show the BRKs in the archive.")
+    list_parser.add_argument("archive")
+    
+    extract_parser = actions.add_parser("extract", help="Write every BRK in the archive as json to DIR/<path in archive>.json.")
+    extract_parser.add_argument("archive")
+    extract_parser.add_argument("directory", metavar="DIR")
+    extract_parser.add_argument("--compact", action="store_true",
+                                help="Write json without indentation and line breaks.")
+    
+    replace_parser = actions.add_parser("replace", 
+                                        help=(
+                                            "Convert DIR/<path in archive>.json of every BRK in the archive that has one "
+                                            "and write the archive with the new BRKs."
+                                        ))
+    replace_parser.add_argument("archive")
+    replace_parser.add_argument("directory", metavar="DIR")
+    replace_parser.add_argument("-o", "--output", default=None,
+                                help="Where to write the new archive. Defaults to overwriting the archive.")
+    replace_parser.add_argument("--packing", default="dedup", choices=("dedup", "overlap"),
+                                help="How keyframes are packed into the value tables of the BRKs, see the main options.")
+    replace_parser.add_argument("--compact-tangents", action="store_true",
+                                help="Store keyframes without a separate outgoing tangent where possible, see the main options.")
+    replace_parser.add_argument("--compress", dest="compress", action="store_const", const=True, default=None,
+                                help="Yaz0 compress the new archive. By default it is compressed if the old one was.")
+    replace_parser.add_argument("--no-compress", dest="compress", action="store_const", const=False,
+                                help="Don't compress the new archive.")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    archive = load_archive(args.archive)
+    
+    if args.action == "list":
+        for path, brk in archive.brks(lazy=True):
+            print("{0}  {1} register, {2} constant animations, {3} frames".format(
+                path, len(brk.register_animations), len(brk.constant_animations), brk.duration))
+    elif args.action == "extract":
+        for path, brk in archive.brks():
+            output = _archive_member_path(args.directory, path)
+            if output is None:
+                print("Skipped {0}, its path leads outside of {1}".format(path, args.directory))
+                continue
+            
+            output += ".json"
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            dump_json(brk, output, compact=args.compact)
+            print("Wrote", output)
+    else:
+        replaced = 0
+        for file in archive.brk_files():
+            source = _archive_member_path(args.directory, file.path)
+            if source is None:
+                print("Skipped {0}, its path leads outside of {1}".format(file.path, args.directory))
+                continue
+            
+            source += ".json"
+            if not os.path.exists(source):
+                continue
+            
+            archive.replace_brk(file.path, load_json(source), args.packing, args.compact_tangents)
+            replaced += 1
+        
+        output = args.output or args.archive
+        _write_atomic(output, archive.to_bytes(args.compress))
+        print("Replaced {0} BRK(s), wrote {1}".format(replaced, output))
+
+
+def simplify_main(argv, prog):
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=(
+            "Remove keyframes from a BRK or json file as long as the color of every animation at every frame "
+            "stays within the tolerance, and store colors that don't change as a single value."
+        ))
+    parser.add_argument("input", help="BRK or json file.")
+    parser.add_argument("output", nargs="?", default=None,
+                        help="Where to write the result, in the same format as the input. Defaults to overwriting the input.")
+    parser.add_argument("-t", "--tolerance", type=int, default=0,
+                        help="How far the rounded colors may move, 0 (default) keeps them exactly the same.")
+    _add_output_options(parser)
+    
+    args = parser.parse_args(argv)
+    if args.tolerance < 0:
+        parser.error("tolerance can't be negative")
+    
+    brk_input = is_brk_file(args.input)
+    brk = _load(args.input)
+    
+    size_before = len(brk.to_bytes(args.packing, args.compact_tangents))
+    keyframes_before, keyframes_after = brk.simplify(args.tolerance)
+    size_after = len(brk.to_bytes(args.packing, args.compact_tangents))
+    
+    output = args.output or args.input
+    _save(brk, output, brk_input, args)
+    
+    print("Keyframes: {0} -> {1}, BRK size: {2} -> {3} bytes ({4:.1%} smaller), wrote {5}".format(
+        keyframes_before, keyframes_after, size_before, size_after, 
+        1 - size_after/size_before if size_before else 0.0, output))
+
+
+def merge_main(argv, prog):
+    from .merge import DUPLICATE_POLICIES, merge_brks
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=(
+            "Combine the animations of several BRK or json files into one. Keyframes that appear "
+            "in more than one file are stored only once in the result."
+        ))
+    parser.add_argument("inputs", nargs="+", metavar="input", help="BRK or json files.")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Where to write the result, as json if it ends in .json, otherwise as BRK.")
+    parser.add_argument("--duplicates", default="last", choices=DUPLICATE_POLICIES,
+                        help=(
+                            "What to do with animations for the same material and color index: "
+                            "use the one from the last (default) or first file that has one, keep all of them, or stop with an error."
+                        ))
+    _add_output_options(parser)
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    merged = merge_brks([_load(input) for input in args.inputs], args.duplicates)
+    _save(merged, args.output, not args.output.lower().endswith(".json"), args)
+    
+    input_size = sum(os.path.getsize(input) for input in args.inputs if is_brk_file(input))
+    print("Merged {0} file(s) into {1}: {2} register and {3} constant animations, {4} bytes as BRK{5}".format(
+        len(args.inputs), args.output, len(merged.register_animations), len(merged.constant_animations),
+        len(merged.to_bytes(args.packing, args.compact_tangents)),
+        " (input BRKs: {0} bytes)".format(input_size) if input_size else ""))
+
+
+# Material name as part of a file name
+def _file_name_part(name):
+    return "".join(char if char.isalnum() or char in "-_." else "_" for char in name)
+
+
+def split_main(argv, prog):
+    from .merge import split_materials
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=(
+            "Extract the animations of some materials from a BRK or json file into a new file, "
+            "or write a file for every material."
+        ))
+    parser.add_argument("input", help="BRK or json file.")
+    parser.add_argument("-m", "--material", action="append", default=[],
+                        help="Material to extract, can be given more than once. Requires --output.")
+    parser.add_argument("-o", "--output", default=None,
+                        help="File for the extracted materials, in the same format as the input.")
+    parser.add_argument("-d", "--directory", default=None,
+                        help=(
+                            "Without --material, write <input name>.<material>.<brk or json> for every material "
+                            "to this folder. Defaults to the folder of the input."
+                        ))
+    _add_output_options(parser)
+    
+    args = parser.parse_args(argv)
+    if args.material and args.output is None:
+        parser.error("--material requires --output")
+    if args.output is not None and not args.material:
+        parser.error("--output requires --material")
+    
+    brk_input = is_brk_file(args.input)
+    brk = _load(args.input, lazy=True)
+    
+    if args.material:
+        extracted = brk.extract(args.material)
+        found = set(anim.name for anim in extracted.register_animations) | set(anim.name for anim in extracted.constant_animations)
+        for name in args.material:
+            if name not in found:
+                print("No animations for material", name)
+        
+        _save(extracted, args.output, brk_input, args)
+        print("Wrote", args.output)
+    else:
+        directory = args.directory if args.directory is not None else os.path.dirname(args.input)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        base, extension = os.path.splitext(os.path.basename(args.input))
+        
+        used = set()
+        for name, part in split_materials(brk).items():
+            # Different names can end up as the same file name
+            file_name = "{0}.{1}".format(base, _file_name_part(name))
+            suffix = 1
+            while file_name.lower() in used:
+                suffix += 1
+                file_name = "{0}.{1}_{2}".format(base, _file_name_part(name), suffix)
+            used.add(file_name.lower())
+            
+            output = os.path.join(directory, file_name + extension)
+            _save(part, output, brk_input, args)
+            print("Wrote", output)
+
+
+def diff_main(argv, prog):
+    from .fingerprint import diff_brks
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=(
+            "Show the differences between the animations of two BRK or json files: loop mode, duration, "
+            "animations that only one of them has and changed keyframes. How the files store the "
+            "animations doesn't matter. The exit code is 1 if there are differences."
+        ))
+    parser.add_argument("first", help="BRK or json file.")
+    parser.add_argument("second", help="BRK or json file.")
+    
+    args = parser.parse_args(argv)
+    
+    lines = diff_brks(_load(args.first), _load(args.second))
+    for line in lines:
+        print(line)
+    
+    if lines:
+        sys.exit(1)
+    print("The animations are the same.")
+
+
+def fingerprint_main(argv, prog):
+    import json
+    from .fingerprint import MANIFEST_VERSION, compare_entry, fingerprint_files
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=(
+            "Compute a fingerprint of the animations of BRK and json files that doesn't depend on how they are stored, "
+            "save them as a manifest or compare them with a manifest saved earlier."
+        ))
+    parser.add_argument("inputs", nargs="*", metavar="input", help="BRK or json files.")
+    parser.add_argument("-r", "--recursive", metavar="DIR", action="append", default=[],
+                        help="Use all brk and json files in DIR and its subdirectories. Can be given more than once.")
+    parser.add_argument("-o", "--output", default=None, metavar="MANIFEST",
+                        help="Save the fingerprints as json to this file.")
+    parser.add_argument("--compare", default=None, metavar="MANIFEST",
+                        help=(
+                            "Compare the files with a manifest saved earlier. Files whose bytes didn't change aren't read again. "
+                            "The exit code is 1 if any file changed, is new or is missing."
+                        ))
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of processes. Defaults to the number of CPUs.")
+    
+    args = parser.parse_args(argv)
+    
+    paths = list(args.inputs)
+    for directory in args.recursive:
+        paths.extend(find_inputs(directory))
+    if not paths:
+        parser.error("no input given")
+    
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise RuntimeError("Unsupported manifest version: {0}".format(manifest.get("version")))
+        baseline = manifest["files"]
+    
+    results = fingerprint_files(paths, baseline, args.jobs)
+    
+    failed = False
+    entries = {}
+    errors = set()
+    for path, entry, error in results:
+        if error is not None:
+            print("Failed to read {0}: {1}".format(path, error))
+            errors.add(path)
+            failed = True
+            continue 
+        
+        entries[path] = entry
+        if baseline is None:
+            print(entry["fingerprint"], path)
+    
+    if baseline is not None:
+        counts = {"failed": len(errors)} if errors else {}
+        # Files that couldn't be read were already reported and aren't missing
+        for path in list(entries) + [path for path in baseline if path not in entries and path not in errors]:
+            status, detail = compare_entry(entries.get(path), baseline.get(path))
+            counts[status] = counts.get(status, 0) + 1
+            if status not in ("unchanged", "equivalent"):
+                failed = True
+            if status != "unchanged":
+                print("{0:<11} {1}{2}".format(status, path, " ({0})".format(detail) if detail else ""))
+        
+        print(", ".join("{0} {1}".format(counts[status], status) 
+                        for status in ("unchanged", "equivalent", "changed", "new", "missing", "failed") if status in counts))
+    
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": entries}, f, indent=1)
+    
+    if failed:
+        sys.exit(1)
+
+
+def validate_main(argv, prog):
+    import json
+    from .validate import validate_files
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=(
+            "Check BRK and json files for problems: broken headers and offsets, wrong string table hashes, "
+            "keyframes that don't fit in their value table or are out of order (errors), keyframes after the duration, "
+            "color values the game can't use and duplicate materials (warnings). All problems of a file are reported, "
+            "not only the first one. The exit code is 1 if any file has errors."
+        ))
+    parser.add_argument("inputs", nargs="*", metavar="input", help="BRK or json files.")
+    parser.add_argument("-r", "--recursive", metavar="DIR", action="append", default=[],
+                        help="Use all brk and json files in DIR and its subdirectories. Can be given more than once.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of processes. Defaults to the number of CPUs.")
+    parser.add_argument("--strict", action="store_true",
+                        help="Treat warnings as errors.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the problems as json, a list of objects with path, severity, code, offset and message.")
+    
+    args = parser.parse_args(argv)
+    
+    paths = list(args.inputs)
+    for directory in args.recursive:
+        paths.extend(find_inputs(directory))
+    if not paths:
+        parser.error("no input given")
+    
+    results = validate_files(paths, args.jobs)
+    
+    counts = {"error": 0, "warning": 0}
+    failed_files = 0
+    output = []
+    for path, issues in results:
+        failed = False
+        for issue in issues:
+            counts[issue.severity] += 1
+            if issue.severity == "error" or args.strict:
+                failed = True
+            
+            if args.json:
+                output.append(dict(path=path, **issue._asdict()))
+            else:
+                offset = " @0x{0:x}".format(issue.offset) if issue.offset is not None else ""
+                print("{0}: {1} [{2}]{3}: {4}".format(path, issue.severity, issue.code, offset, issue.message))
+        
+        if failed:
+            failed_files += 1
+    
+    if args.json:
+        print(json.dumps(output, indent=1, ensure_ascii=False))
+    else:
+        print("{0} files, {1} errors, {2} warnings, {3} failed".format(
+            len(results), counts["error"], counts["warning"], failed_files))
+    
+    if failed_files:
+        sys.exit(1)
+
+
+def verify_roundtrip_main(argv, prog):
+    from .roundtrip import ROUNDTRIP_STATUSES, roundtrip_files
+    
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=(
+            "Convert BRKs to json and back in memory, without writing any files, and compare the result with the original. "
+            "Each BRK is reported as identical (same bytes), equivalent (different bytes, same animations) or different, "
+            "with the offset of the first byte that differs. The exit code is 1 if any BRK is different or couldn't be read."
+        ))
+    parser.add_argument("inputs", nargs="*", metavar="input", help="BRK files, or .arc and .szs archives with --archives.")
+    parser.add_argument("-r", "--recursive", metavar="DIR", action="append", default=[],
+                        help="Use all brk files in DIR and its subdirectories. Can be given more than once.")
+    parser.add_argument("--archives", action="store_true",
+                        help="Also check the BRKs inside .arc and .szs archives found with --recursive.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of processes. Defaults to the number of CPUs.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Also list the identical BRKs.")
+    _add_output_options(parser)
+    
+    args = parser.parse_args(argv)
+    
+    extensions = (".brk", ".arc", ".szs") if args.archives else (".brk",)
+    paths = list(args.inputs)
+    for directory in args.recursive:
+        paths.extend(find_inputs(directory, extensions))
+    if not paths:
+        parser.error("no input given")
+    
+    results = roundtrip_files(paths, args.jobs, packing=args.packing, 
+                              compact_tangents=args.compact_tangents, compact=args.compact)
+    
+    counts = {}
+    for name, status, detail in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status != "identical" or args.verbose:
+            print("{0:<10} {1}{2}".format(status, name, " ({0})".format(detail) if detail else ""))
+    
+    print(", ".join("{0} {1}".format(counts[status], status) for status in ROUNDTRIP_STATUSES if status in counts) 
+          or "No BRKs found")
+    
+    if counts.get("different") or counts.get("failed"):
+        sys.exit(1)
+
+
+COMMANDS = {
+    "archive": archive_main,
+    "simplify": simplify_main,
+    "merge": merge_main,
+    "split": split_main,
+    "diff": diff_main,
+    "fingerprint": fingerprint_main,
+    "validate": validate_main,
+    "verify-roundtrip": verify_roundtrip_main,
+}
@@ -0,0 +1,185 @@
+import codecs
+import io
+import logging
+import os
+from functools import partial
+
+from .brk import BRKFILEMAGIC, BRKAnim
+
+log = logging.getLogger(__name__)
+
+
+def detect_encoding(path):
+    # Detect BOM of input file
+    with open(path, "rb") as f:
+        return bom_encoding(f.read(4))
+
+
+def bom_encoding(data):
+    bom = bytes(data[:4])
+    
+    if bom.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    elif bom.startswith(codecs.BOM_UTF32_LE) or bom.startswith(codecs.BOM_UTF32_BE):
+        return "utf-32"
+    elif bom.startswith(codecs.BOM_UTF16_LE) or bom.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16"
+    else:
+        return "utf-8"
+
+
+def is_brk_file(path):
+    with open(path, "rb") as f:
+        return f.read(8) == BRKFILEMAGIC
+
+
+# Convert the contents of a BRK to json or of a json file to BRK. Returns the converted
+# data (json is encoded as utf-8) and whether the input was a BRK. If a ConversionCache is given,
+# a cached result is returned without parsing the input. 
+def convert_bytes(data, packing="dedup", compact_tangents=False, compact=False, cache=None):
+    brk_to_json = bytes(data[:8]) == BRKFILEMAGIC
+    
+    if cache is not None:
+        key = cache.key(data, {"packing": packing, "compact_tangents": compact_tangents, "compact": compact})
+        result = cache.get(key)
+        if result is not None:
+            log.info("Using cached result")
+            return result, brk_to_json 
+    
+    if brk_to_json:
+        brk = BRKAnim.from_bytes(data)
+        text = io.StringIO()
+        brk.dump(text, compact=compact)
+        result = text.getvalue().encode("utf-8")
+    else:
+        encoding = bom_encoding(data)
+        log.info("Assuming encoding of input file: %s", encoding)
+        
+        brk = BRKAnim.from_json(io.StringIO(bytes(data).decode(encoding)))
+        result = bytes(brk.to_bytes(packing, compact_tangents))
+    
+    if cache is not None:
+        cache.put(key, result)
+    
+    return result, brk_to_json
+
+
+# Convert a BRK to json or a json file to BRK. Returns the path of the written file.
+def convert_file(input, output=None, packing="dedup", compact_tangents=False, compact=False, cache=None):
+    import mmap
+    
+    with open(input, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            result, brk_to_json = convert_bytes(data, packing, compact_tangents, compact, cache)
+
+    if output is None:
+        if brk_to_json:
+            output = input+".json"
+        else:
+            output = input+".brk"
+
+    if brk_to_json:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(result.decode("utf-8"))
+    else:
+        with open(output, "wb") as f:
+            f.write(result)
+        log.info("Finished writing BRK.")
+    
+    return output
+
+
+# Read a BRK from a path, a binary file or a bytes-like object. With lazy, animations are 
+# only decoded when they are accessed (see BRKAnim.from_bytes). 
+def load_brk(source, lazy=False):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BRKAnim.from_bytes(source, lazy)
+    elif hasattr(source, "read"):
+        return BRKAnim.from_brk(source, lazy)
+    else:
+        with open(source, "rb") as f:
+            return BRKAnim.from_bytes(f.read(), lazy)
+
+
+# Read the json format from a path or a text file. The encoding of a path is detected from its BOM.
+def load_json(source):
+    if hasattr(source, "read"):
+        return BRKAnim.from_json(source)
+    
+    with open(source, "rb") as f:
+        data = f.read()
+    
+    return BRKAnim.from_json(io.StringIO(data.decode(bom_encoding(data))))
+
+
+# Write a BRK as json to a path or a text file
+def dump_json(brk, target, digits=None, compact=False):
+    if hasattr(target, "write"):
+        brk.dump(target, digits, compact)
+    else:
+        with open(target, "w", encoding="utf-8") as f:
+            brk.dump(f, digits, compact)
+
+
+# Write a BRK to a path or a binary file
+def write_brk(brk, target, packing="dedup", compact_tangents=False):
+    if hasattr(target, "write"):
+        brk.write_brk(target, packing, compact_tangents)
+    else:
+        with open(target, "wb") as f:
+            brk.write_brk(f, packing, compact_tangents)
+
+
+# Find all BRK and json files (or files with other extensions) in a directory and its subdirectories.
+# Files that are the default output of another file that was found (e.g. a.brk.json next to a.brk)
+# are skipped so that running a batch conversion twice doesn't convert the results again.
+def find_inputs(directory, extensions=(".brk", ".json")):
+    found = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(tuple(extensions)):
+                found.append(os.path.join(dirpath, filename))
+    
+    found_set = set(found)
+    inputs = []
+    for path in found:
+        if path.lower().endswith(".brk.json") and path[:-5] in found_set:
+            continue 
+        if path.lower().endswith(".json.brk") and path[:-4] in found_set:
+            continue 
+        inputs.append(path)
+    
+    return inputs
+
+
+def _run_item(call):
+    func, item = call
+    try:
+        return func(item), None
+    except Exception as err:
+        return None, "{0}: {1}".format(type(err).__name__, err)
+
+
+# Call func with every item, each on one of jobs processes (the number of CPUs by default),
+# and return (result, error) for every item in order. An item that raises an exception
+# doesn't stop the others, its error is the exception as text and its result None.
+# func has to be picklable, e.g. a module level function or a functools.partial of one.
+def run_parallel(func, items, jobs=None):
+    calls = [(func, item) for item in items]
+    
+    if jobs == 1 or len(calls) <= 1:
+        return [_run_item(call) for call in calls]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_run_item, calls, chunksize=8))
+
+
+# Convert every input on its own process. A file that fails to convert doesn't stop the others.
+# Returns (input, output, error) for every input, where either output or error is None.
+def convert_batch(inputs, jobs=None, **options):
+    inputs = list(inputs)
+    results = run_parallel(partial(convert_file, **options), inputs, jobs)
+    return [(input, output, error) for input, (output, error) in zip(inputs, results)]
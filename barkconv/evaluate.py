@@ -0,0 +1,179 @@
+import math
+from array import array
+from bisect import bisect_right
+
+from .brk import AnimTrack
+
+
+# Cubic Hermite interpolation of the curve from p0 to p1 with tangents s0 and s1. 
+# Returns the coefficients of the cubic polynomial in t, where t goes from 0 to 1.
+def hermite_coefficients(p0, p1, s0, s1):
+    return (2*p0 - 2*p1 + s0 + s1,
+            -3*p0 + 3*p1 - 2*s0 - s1,
+            s0,
+            p0)
+
+
+# Value of a track at every frame from 0 to frame_count-1. Frames before the first or after 
+# the last keyframe have the value of that keyframe, a track with a single keyframe is constant.
+# Tangents are given per frame, so they are scaled by the length of each segment. 
+# All frames of a segment are evaluated in one go.
+def evaluate_track(track, frame_count):
+    if not isinstance(track, AnimTrack):
+        track = AnimTrack(track)
+    
+    if len(track) == 0:
+        return [0.0]*frame_count
+    
+    times, values = track.time, track.value
+    
+    if len(track) == 1:
+        return [float(values[0])]*frame_count
+    
+    result = [float(values[0])]*min(frame_count, max(0, times[0]))
+    
+    for i in range(len(track)-1):
+        t0, t1 = times[i], times[i+1]
+        start = max(t0, len(result))
+        end = min(t1, frame_count)
+        if end <= start:
+            continue 
+        
+        length = t1 - t0
+        cf0, cf1, cf2, cf3 = hermite_coefficients(
+            values[i], values[i+1], 
+            track.tangentOut[i]*length, track.tangentIn[i+1]*length)
+        scale = 1.0/length
+        
+        result.extend([((cf0*t + cf1)*t + cf2)*t + cf3 
+                       for t in [(frame - t0)*scale for frame in range(start, end)]])
+    
+    result.extend([float(values[-1])]*(frame_count - len(result)))
+    
+    return result
+
+
+# Evaluate the animations at every frame from 0 to frame_count-1. The colors are rounded
+# to the nearest integer and stored in one array of size len(animations)*frame_count*4, 
+# ordered by animation, then frame, then R, G, B and A.
+def bake_colors(animations, frame_count):
+    baked = array("h")
+    
+    for anim in animations:
+        block = [0]*(frame_count*4)
+        
+        for i, comp in enumerate(("R", "G", "B", "A")):
+            block[i::4] = [min(0x7FFF, max(-0x8000, math.floor(val + 0.5))) 
+                           for val in evaluate_track(anim.component[comp], frame_count)]
+        
+        baked.extend(block)
+    
+    return baked
+
+
+# Map a playback frame to the time in the animation for the loop modes of a BRK:
+# 0 and 1 play once, 2 loops, 3 plays once forward and then backward, 4 is like 3 but on repeat.
+# Frames can be fractional.
+def loop_time(frame, loop_mode, duration):
+    if duration <= 0:
+        return 0.0
+    
+    if loop_mode == 2:
+        return frame % duration
+    elif loop_mode == 3:
+        if frame < duration:
+            return max(0, frame)
+        return max(0, 2*duration - frame)
+    elif loop_mode == 4:
+        frame = frame % (2*duration)
+        if frame <= duration:
+            return frame
+        return 2*duration - frame
+    else:
+        return min(max(0, frame), duration)
+
+
+# Value of the track at time if time is in the segment that starts at keyframe index 
+# (-1 for before the first keyframe)
+def _segment_value(track, index, time):
+    if len(track) == 0:
+        return 0.0
+    if index < 0:
+        return float(track.value[0])
+    if index >= len(track)-1:
+        return float(track.value[-1])
+    
+    t0, t1 = track.time[index], track.time[index+1]
+    if t1 <= t0:
+        return float(track.value[index])
+    
+    length = t1 - t0
+    cf0, cf1, cf2, cf3 = hermite_coefficients(
+        track.value[index], track.value[index+1], 
+        track.tangentOut[index]*length, track.tangentIn[index+1]*length)
+    t = (time - t0)/length
+    
+    return ((cf0*t + cf1)*t + cf2)*t + cf3
+
+
+def _tracks(anim):
+    tracks = []
+    for comp in ("R", "G", "B", "A"):
+        track = anim.component[comp]
+        if not isinstance(track, AnimTrack):
+            track = AnimTrack(track)
+        tracks.append(track)
+    return tracks
+
+
+# RGBA of a ColorAnimation at a (fractional) frame. The keyframe segment is found by bisecting
+# the keyframe times. If duration is given, the frame is mapped to the animation time with the loop mode.
+def sample(anim, frame, loop_mode=1, duration=None):
+    if duration is not None:
+        frame = loop_time(frame, loop_mode, duration)
+    
+    return tuple(_segment_value(track, bisect_right(track.time, frame) - 1, frame) 
+                 for track in _tracks(anim))
+
+
+# Samples a ColorAnimation during playback. The current keyframe segment of each component is
+# remembered, so moving forward takes constant time per frame. When the time goes back 
+# (looping or playing backward) the segment is found by bisecting again.
+class SampleCursor(object):
+    def __init__(self, anim, loop_mode=1, duration=None):
+        self.loop_mode = loop_mode
+        self.duration = duration
+        self.frame = 0.0
+        
+        self._tracks = _tracks(anim)
+        self._segments = [-1]*len(self._tracks)
+    
+    def seek(self, frame):
+        self.frame = frame 
+        return self.value()
+    
+    def advance(self, step=1):
+        self.frame += step 
+        return self.value()
+    
+    # RGBA at the current frame
+    def value(self):
+        time = self.frame 
+        if self.duration is not None:
+            time = loop_time(time, self.loop_mode, self.duration)
+        
+        rgba = []
+        for i, track in enumerate(self._tracks):
+            times = track.time 
+            index = self._segments[i]
+            
+            if index < 0 or times[index] <= time:
+                while index+1 < len(times) and times[index+1] <= time:
+                    index += 1
+            else:
+                index = bisect_right(times, time) - 1
+            
+            self._segments[i] = index
+            rgba.append(_segment_value(track, index, time))
+        
+        return tuple(rgba)
@@ -0,0 +1,197 @@
+import hashlib
+import io
+import struct
+import sys
+from collections import Counter
+
+from .brk import BRKFILEMAGIC, AnimTrack, BRKAnim
+from .convert import bom_encoding, run_parallel
+
+MANIFEST_VERSION = 1
+
+
+def _track(track):
+    if not isinstance(track, AnimTrack):
+        track = AnimTrack(track)
+    return track
+
+
+# Keyframes of a track as they behave in the game: a single keyframe is stored as only
+# its value in a BRK and read back as (0, value, 0, 0), so only its value counts
+def _keyframes(track):
+    track = _track(track)
+    if len(track) == 1:
+        return [(0, track.value[0], 0, 0)]
+    return list(track.rows())
+
+
+def _track_bytes(track):
+    track = _track(track)
+    if len(track) == 1:
+        return struct.pack(">Ih", 1, track.value[0])
+    
+    data = [struct.pack(">I", len(track))]
+    for column in (track.time, track.value, track.tangentIn, track.tangentOut):
+        if sys.byteorder == "little":
+            column = column[:]
+            column.byteswap()
+        data.append(column.tobytes())
+    return b"".join(data)
+
+
+# Hash of the material name, color index and keyframes of an animation. It doesn't depend on
+# how the keyframes are stored in a BRK (offsets, sharing between animations, tangent type).
+def animation_fingerprint(anim):
+    hash = hashlib.blake2b(digest_size=16)
+    hash.update(repr((anim.name, anim.colornum)).encode("utf-8"))
+    for comp in ("R", "G", "B", "A"):
+        hash.update(_track_bytes(anim.component[comp]))
+    return hash.hexdigest()
+
+
+# Hash of the loop mode, the duration and the animations of each type. The order of the
+# animations doesn't matter, the game finds them by material name.
+def brk_fingerprint(brk):
+    hash = hashlib.blake2b(digest_size=16)
+    hash.update("{0} {1}".format(brk.loop_mode, brk.duration).encode("ascii"))
+    
+    for animtype, animations in (("register", brk.register_animations), ("constant", brk.constant_animations)):
+        hash.update(animtype.encode("ascii"))
+        for fingerprint in sorted(animation_fingerprint(anim) for anim in animations):
+            hash.update(fingerprint.encode("ascii"))
+    
+    return hash.hexdigest()
+
+
+def _group(animations):
+    groups = {}
+    for anim in animations:
+        groups.setdefault((anim.name, anim.colornum), []).append(anim)
+    return groups
+
+
+def _diff_keyframes(prefix, old, new):
+    old, new = _keyframes(old), _keyframes(new)
+    if old == new:
+        return []
+    
+    lines = []
+    if len(old) != len(new):
+        lines.append("{0}: {1} -> {2} keyframes".format(prefix, len(old), len(new)))
+    
+    old_times = dict((keyframe[0], keyframe) for keyframe in old)
+    new_times = dict((keyframe[0], keyframe) for keyframe in new)
+    for time in sorted(set(old_times) | set(new_times)):
+        if time not in new_times:
+            lines.append("{0}: removed keyframe {1}".format(prefix, list(old_times[time])))
+        elif time not in old_times:
+            lines.append("{0}: added keyframe {1}".format(prefix, list(new_times[time])))
+        elif old_times[time] != new_times[time]:
+            lines.append("{0}: keyframe at frame {1} changed {2} -> {3}".format(
+                prefix, time, list(old_times[time]), list(new_times[time])))
+    
+    if not lines:
+        lines.append("{0}: keyframes changed order".format(prefix))
+    return lines
+
+
+# Differences between two BRKs as lines of text: loop mode, duration, animations that only one
+# of them has and changed keyframes. Animations are matched by type, material name and color
+# index (in order, if there are several of them). Animations with the same fingerprint are skipped.
+# Returns an empty list if the BRKs behave the same.
+def diff_brks(old, new):
+    lines = []
+    if old.loop_mode != new.loop_mode:
+        lines.append("loop mode: {0} -> {1}".format(old.loop_mode, new.loop_mode))
+    if old.duration != new.duration:
+        lines.append("duration: {0} -> {1}".format(old.duration, new.duration))
+    
+    for animtype, old_animations, new_animations in (
+            ("register", old.register_animations, new.register_animations),
+            ("constant", old.constant_animations, new.constant_animations)):
+        old_groups, new_groups = _group(old_animations), _group(new_animations)
+        
+        # Keys in the order they first appear, first in old, then in new
+        keys = list(old_groups)
+        keys.extend(key for key in new_groups if key not in old_groups)
+        
+        for name, colornum in keys:
+            olds = old_groups.get((name, colornum), [])
+            news = new_groups.get((name, colornum), [])
+            prefix = "{0} {1} color {2}".format(animtype, name, colornum)
+            
+            for i in range(max(len(olds), len(news))):
+                label = prefix if max(len(olds), len(news)) == 1 else "{0} #{1}".format(prefix, i+1)
+                
+                if i >= len(news):
+                    lines.append("{0}: only in first".format(label))
+                elif i >= len(olds):
+                    lines.append("{0}: only in second".format(label))
+                elif animation_fingerprint(olds[i]) != animation_fingerprint(news[i]):
+                    for comp in ("R", "G", "B", "A"):
+                        lines.extend(_diff_keyframes("{0} {1}".format(label, comp),
+                                                     olds[i].component[comp], news[i].component[comp]))
+    
+    return lines
+
+
+def _load_bytes(data):
+    if bytes(data[:8]) == BRKFILEMAGIC:
+        return BRKAnim.from_bytes(data)
+    return BRKAnim.from_json(io.StringIO(data.decode(bom_encoding(data))))
+
+
+# Manifest entry of a BRK or json file: hash of its bytes, fingerprint of the whole file and the
+# material name, color index and fingerprint of every animation. If the bytes are the same as in
+# the baseline entry, that entry is returned without reading the animations.
+def fingerprint_file(path, baseline=None):
+    with open(path, "rb") as f:
+        data = f.read()
+    
+    sha256 = hashlib.sha256(data).hexdigest()
+    if baseline is not None and baseline.get("sha256") == sha256:
+        return baseline
+    
+    brk = _load_bytes(data)
+    return {
+        "sha256": sha256,
+        "fingerprint": brk_fingerprint(brk),
+        "register": [[anim.name, anim.colornum, animation_fingerprint(anim)] for anim in brk.register_animations],
+        "constant": [[anim.name, anim.colornum, animation_fingerprint(anim)] for anim in brk.constant_animations],
+    }
+
+
+def _fingerprint_item(item):
+    path, baseline = item
+    return fingerprint_file(path, baseline)
+
+
+# Manifest entries of many files, on a pool of processes (see run_parallel). baseline is a dict of
+# path to entry from an earlier manifest. Returns (path, entry, error) for every path.
+def fingerprint_files(paths, baseline=None, jobs=None):
+    items = [(path, (baseline or {}).get(path)) for path in paths]
+    results = run_parallel(_fingerprint_item, items, jobs)
+    return [(path, entry, error) for (path, old), (entry, error) in zip(items, results)]
+
+
+# Compare manifest entries with a baseline: returns (status, detail) with status "unchanged"
+# (same bytes), "equivalent" (same animations), "changed", "new" or "missing". For changed
+# files, detail lists the materials whose animations differ.
+def compare_entry(entry, baseline):
+    if baseline is None:
+        return "new", ""
+    if entry is None:
+        return "missing", ""
+    if entry["sha256"] == baseline["sha256"]:
+        return "unchanged", ""
+    if entry["fingerprint"] == baseline["fingerprint"]:
+        return "equivalent", ""
+    
+    changed = set()
+    for animtype in ("register", "constant"):
+        old = Counter(map(tuple, baseline[animtype]))
+        new = Counter(map(tuple, entry[animtype]))
+        for name, colornum, fingerprint in (old - new) + (new - old):
+            changed.add("{0} {1}".format(animtype, name))
+    
+    return "changed", ", ".join(sorted(changed)) or "loop mode or duration"
@@ -0,0 +1,91 @@
+import logging
+
+from .brk import BRKAnim
+
+log = logging.getLogger(__name__)
+
+# What merge_brks does with animations for the same material and color index:
+# keep the first one, the last one, all of them or raise an error
+DUPLICATE_POLICIES = ("first", "last", "keep", "error")
+
+
+def _animations(brk, animtype):
+    if animtype == "register":
+        return brk.register_animations
+    elif animtype == "constant":
+        return brk.constant_animations
+    else:
+        raise RuntimeError("unknown animation type: {0}".format(animtype))
+
+
+# Combine the register and constant animations of several BRKs into one new BRK. The animations
+# are copied, so the BRKs can still be changed afterwards. When more than one BRK has animations
+# for the same material name and color index, on_duplicate decides which BRK's animations are used,
+# see DUPLICATE_POLICIES. Animations of one BRK are never dropped for each other. The result has the
+# animations in the order of the BRKs, then in their order in each BRK. The loop mode of the first
+# BRK and the longest duration are used unless they are given. 
+# Writing the result builds the value tables from the keyframes of all files together, so 
+# keyframes that appear in more than one file are only stored once.
+def merge_brks(brks, on_duplicate="last", loop_mode=None, duration=None):
+    if on_duplicate not in DUPLICATE_POLICIES:
+        raise RuntimeError("unknown duplicate policy: {0}".format(on_duplicate))
+    if len(brks) == 0:
+        raise RuntimeError("No BRKs to merge")
+    
+    if loop_mode is None:
+        loop_mode = brks[0].loop_mode
+        if any(brk.loop_mode != loop_mode for brk in brks):
+            log.warning("BRKs have different loop modes, using loop mode %d of the first one", loop_mode)
+    if duration is None:
+        duration = max(brk.duration for brk in brks)
+    
+    merged = BRKAnim(loop_mode, duration)
+    
+    for animtype in ("register", "constant"):
+        # Index of the BRK whose animations are used for each (name, color index)
+        owner = {}
+        for index, brk in enumerate(brks):
+            for anim in _animations(brk, animtype):
+                key = (anim.name, anim.colornum)
+                
+                if key not in owner or on_duplicate == "last":
+                    owner[key] = index 
+                elif owner[key] != index and on_duplicate == "error":
+                    raise RuntimeError("More than one BRK has {0} animations for material {1}, color {2}".format(
+                        animtype, key[0], key[1]))
+        
+        result = _animations(merged, animtype)
+        for index, brk in enumerate(brks):
+            result.extend(anim.copy() for anim in _animations(brk, animtype) 
+                          if on_duplicate == "keep" or owner[(anim.name, anim.colornum)] == index)
+    
+    return merged
+
+
+# New BRK with copies of the animations of the given material names, in the order they 
+# have in brk. Animations of a lazily loaded BRK that aren't extracted aren't decoded. 
+def extract_materials(brk, names):
+    names = set(names)
+    extracted = BRKAnim(brk.loop_mode, brk.duration)
+    
+    for animtype in ("register", "constant"):
+        animations = _animations(brk, animtype)
+        _animations(extracted, animtype).extend(
+            animations[i].copy() for i, name in enumerate(brk.material_names(animtype)) if name in names)
+    
+    return extracted
+
+
+# One BRK for every material name, as a dict in the order the materials first appear
+def split_materials(brk):
+    split = {}
+    
+    for animtype in ("register", "constant"):
+        animations = _animations(brk, animtype)
+        
+        for i, name in enumerate(brk.material_names(animtype)):
+            if name not in split:
+                split[name] = BRKAnim(brk.loop_mode, brk.duration)
+            _animations(split[name], animtype).append(animations[i].copy())
+    
+    return split
@@ -0,0 +1,50 @@
+import sys
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+# Collects wall time and the number of newly allocated memory blocks for each phase of 
+# reading and writing. Enabled with set_profiler.
+class Profiler(object):
+    def __init__(self):
+        self.phases = OrderedDict()  # name: [calls, seconds, blocks]
+    
+    @contextmanager
+    def phase(self, name):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            allocated = sys.getallocatedblocks() - blocks
+            
+            if name not in self.phases:
+                self.phases[name] = [0, 0.0, 0]
+            self.phases[name][0] += 1
+            self.phases[name][1] += elapsed
+            self.phases[name][2] += allocated
+    
+    def report(self):
+        lines = ["{0:<20}{1:>8}{2:>14}{3:>12}".format("phase", "calls", "time (ms)", "blocks")]
+        for name, (calls, seconds, blocks) in self.phases.items():
+            lines.append("{0:<20}{1:>8}{2:>14.3f}{3:>12}".format(name, calls, seconds*1000, blocks))
+        return "\n".join(lines)
+
+
+_profiler = None
+
+
+def set_profiler(profiler):
+    global _profiler
+    _profiler = profiler 
+
+
+@contextmanager
+def profile_phase(name):
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.phase(name):
+            yield
@@ -0,0 +1,133 @@
+import io
+from functools import partial
+
+from .brk import BRKFILEMAGIC, TRK1_HEADER, BRKAnim
+from .convert import run_parallel
+from .fingerprint import brk_fingerprint, diff_brks
+
+ROUNDTRIP_STATUSES = ("identical", "equivalent", "different", "failed")
+
+
+# Offset of the first byte that differs between a and b, or None if they are the same.
+# If one is a prefix of the other, that is the length of the shorter one.
+def first_difference(a, b):
+    if a == b:
+        return None
+    
+    length = min(len(a), len(b))
+    # Compare in blocks so that files that only differ near the end are fast
+    start = 0
+    block = 0x1000
+    while start < length and a[start:start+block] == b[start:start+block]:
+        start += block
+    for i in range(start, min(start+block, length)):
+        if a[i] != b[i]:
+            return i
+    return length
+
+
+# The file size and the TRK1 section size differ whenever the lengths of two BRKs do, so they
+# are left out when looking for the first difference
+def _without_sizes(buffer):
+    buffer = bytearray(buffer)
+    buffer[0x08:0x0C] = bytes(len(buffer[0x08:0x0C]))
+    buffer[0x24:0x28] = bytes(len(buffer[0x24:0x28]))
+    return buffer
+
+
+# Name of the part of a BRK that the offset is in, from the section offsets in its TRK1 header
+def brk_region(buffer, offset):
+    trk_start = 0x20
+    if offset < trk_start:
+        return "file header"
+    if len(buffer) < trk_start + TRK1_HEADER.size:
+        return "TRK1 header"
+    
+    fields = TRK1_HEADER.unpack_from(buffer, trk_start)[7:]
+    regions = [(trk_start, "TRK1 header")]
+    for i, animtype in enumerate(("register", "constant")):
+        regions.append((trk_start + fields[8+i], "{0} animation entries".format(animtype)))
+        regions.append((trk_start + fields[10+i], "{0} index array".format(animtype)))
+        regions.append((trk_start + fields[12+i], "{0} string table".format(animtype)))
+        for j, comp in enumerate(("R", "G", "B", "A")):
+            regions.append((trk_start + fields[14 + i*4 + j], "{0} {1} values".format(animtype, comp)))
+    
+    name = "TRK1 header"
+    for start, region in sorted(regions):
+        if start > offset:
+            break
+        # Empty tables share their offset with the table after them, the last one of them wins
+        name = region
+    return name
+
+
+# Read a BRK, dump it as json, read the json and write it as BRK again, all in memory.
+# Returns (status, detail): "identical" if the new BRK has the same bytes, "equivalent" if
+# it stores the same animations (same fingerprint) and "different" otherwise. detail tells where
+# the first byte differs and, for different files, the first difference in the animations.
+def roundtrip_bytes(data, packing="dedup", compact_tangents=False, compact=False):
+    data = bytes(data)
+    brk = BRKAnim.from_bytes(data)
+    
+    text = io.StringIO()
+    brk.dump(text, compact=compact)
+    text.seek(0)
+    result = BRKAnim.from_json(text).to_bytes(packing, compact_tangents)
+    
+    if data == result:
+        return "identical", ""
+    
+    offset = first_difference(_without_sizes(data), _without_sizes(result))
+    if offset is None:
+        offset = first_difference(data, result)
+    
+    detail = "first difference at 0x{0:x} in the {1}".format(offset, brk_region(data, offset))
+    if len(data) != len(result):
+        detail += ", {0} -> {1} bytes".format(len(data), len(result))
+    
+    new_brk = BRKAnim.from_bytes(result)
+    if brk_fingerprint(brk) == brk_fingerprint(new_brk):
+        return "equivalent", detail
+    
+    lines = diff_brks(brk, new_brk)
+    if lines:
+        detail += "; " + lines[0]
+        if len(lines) > 1:
+            detail += " (and {0} more)".format(len(lines) - 1)
+    return "different", detail
+
+
+# Round trip a BRK file, or every BRK in a .arc or .szs archive, which are reported as
+# archive:path in archive. Returns a list of (name, status, detail).
+def roundtrip_file(path, **options):
+    with open(path, "rb") as f:
+        data = f.read()
+    
+    if data[:8] == BRKFILEMAGIC:
+        return [(path,) + roundtrip_bytes(data, **options)]
+    
+    from .archive import RARC, is_archive
+    
+    if not is_archive(data):
+        raise RuntimeError("Not a BRK or archive")
+    
+    results = []
+    for file in RARC.from_bytes(data).brk_files():
+        name = "{0}:{1}".format(path, file.path)
+        try:
+            results.append((name,) + roundtrip_bytes(file.contents(), **options))
+        except Exception as err:
+            results.append((name, "failed", "{0}: {1}".format(type(err).__name__, err)))
+    return results
+
+
+# Round trip many files on a pool of processes (see run_parallel). Returns (name, status, detail) for
+# every BRK, with status "failed" and the error as detail for files that couldn't be read.
+def roundtrip_files(paths, jobs=None, **options):
+    paths = list(paths)
+    results = []
+    for path, (file_results, error) in zip(paths, run_parallel(partial(roundtrip_file, **options), paths, jobs)):
+        if error is not None:
+            file_results = [(path, "failed", error)]
+        results.extend(file_results)
+    return results
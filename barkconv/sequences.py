@@ -0,0 +1,201 @@
+# Find the start of the sequence seq in the list in_list, if the sequence exists
+def find_sequence(in_list, seq):
+    if len(seq) == 0:
+        return -1
+    
+    for i in range(0, len(in_list)-len(seq)+1):
+        if in_list[i] == seq[0] and in_list[i:i+len(seq)] == seq:
+            return i
+    
+    return -1
+
+
+# Polynomial hash of sequences of values, modulo a Mersenne prime
+_HASH_BASE = 1000003
+_HASH_MOD = (1 << 61) - 1
+
+
+def _hash_values(seq):
+    h = 0
+    for value in seq:
+        h = (h*_HASH_BASE + hash(value)) % _HASH_MOD
+    return h
+
+
+# A list of values that can find sequences in it without scanning the whole list.
+# Sequences that were found before are looked up by their values. Otherwise, for every
+# length that was searched for, the hashes of all runs of values of that length are kept
+# (computed in O(1) each from prefix hashes), so a search only compares the runs with
+# the same hash. find() returns the same position as find_sequence.
+class SequenceIndex(object):
+    def __init__(self):
+        self.values = []
+        self._prefix_hashes = [0]
+        self._powers = [1]
+        self._windows = {}  # length -> {hash of run: starts of the runs, in order}
+        self._exact = {}  # sequence -> first start
+    
+    def _window_hash(self, start, length):
+        return (self._prefix_hashes[start+length] - self._prefix_hashes[start]*self._powers[length]) % _HASH_MOD
+    
+    def _add_windows(self, length, windows, first):
+        for i in range(first, len(self.values)-length+1):
+            h = self._window_hash(i, length)
+            if h in windows:
+                windows[h].append(i)
+            else:
+                windows[h] = [i]
+    
+    def find(self, seq):
+        seq = tuple(seq)
+        if len(seq) == 0:
+            return -1
+        
+        # The first start of a sequence doesn't change when values are added after it
+        start = self._exact.get(seq)
+        if start is not None:
+            return start
+        
+        length = len(seq)
+        if length > len(self.values):
+            return -1
+        
+        windows = self._windows.get(length)
+        if windows is None:
+            while len(self._powers) <= length:
+                self._powers.append(self._powers[-1]*_HASH_BASE % _HASH_MOD)
+            windows = self._windows[length] = {}
+            self._add_windows(length, windows, 0)
+        
+        values = self.values
+        for start in windows.get(_hash_values(seq), ()):
+            if tuple(values[start:start+length]) == seq:
+                self._exact[seq] = start
+                return start
+        
+        return -1
+    
+    def extend(self, seq):
+        old_length = len(self.values)
+        self.values.extend(seq)
+        
+        prefix_hashes = self._prefix_hashes
+        h = prefix_hashes[-1]
+        for value in self.values[old_length:]:
+            h = (h*_HASH_BASE + hash(value)) % _HASH_MOD
+            prefix_hashes.append(h)
+        
+        # Runs that start in the old values but end in the new ones are added as well
+        for length, windows in self._windows.items():
+            self._add_windows(length, windows, max(0, old_length-length+1))
+
+
+# Put sequences into a value table one after another, reusing a sequence 
+# if it already appears whole in the table. Returns the table and the offset of each sequence.
+def dedup_sequences(sequences):
+    index = SequenceIndex()
+    offsets = []
+    
+    for sequence in sequences:
+        offset = index.find(sequence)
+        
+        if offset == -1:
+            offset = len(index.values)
+            index.extend(sequence)
+        
+        offsets.append(offset)
+    
+    return index.values, offsets
+
+
+# Like dedup_sequences, but the table is built as a short common superstring of all sequences: 
+# sequences contained in others are dropped and the rest are chained greedily by the 
+# longest overlap between the end of one sequence and the start of another. 
+# Slower than dedup_sequences. Greedy merging is usually, but not always, shorter than
+# dedup_sequences, so the table of dedup_sequences is returned if it is shorter.
+def pack_sequences(sequences):
+    unique = []
+    seen = set()
+    for sequence in sequences:
+        sequence = tuple(sequence)
+        if len(sequence) > 0 and sequence not in seen:
+            seen.add(sequence)
+            unique.append(sequence)
+    
+    # Longest first so that contained sequences are always checked against the ones containing them.
+    # Kept sequences are separated by None so that a match can't span two of them.
+    unique.sort(key=len, reverse=True)
+    kept = []
+    kept_index = SequenceIndex()
+    for sequence in unique:
+        if kept_index.find(sequence) == -1:
+            kept.append(sequence)
+            kept_index.extend(sequence + (None,))
+    
+    by_first_value = {}
+    for i, sequence in enumerate(kept):
+        by_first_value.setdefault(sequence[0], []).append(i)
+    
+    # Find the longest overlap of the end of each sequence with the start of every other sequence
+    overlaps = []
+    for i, sequence in enumerate(kept):
+        found = set()
+        for pos in range(1, len(sequence)):
+            overlap = len(sequence) - pos
+            for j in by_first_value.get(sequence[pos], ()):
+                if j != i and j not in found and kept[j][:overlap] == sequence[pos:]:
+                    found.add(j)
+                    overlaps.append((overlap, i, j))
+    
+    overlaps.sort(key=lambda item: (-item[0], item[1], item[2]))
+    
+    next_sequence = {}
+    previous_sequence = {}
+    chain_of = list(range(len(kept)))
+    
+    def find_chain(i):
+        while chain_of[i] != i:
+            chain_of[i] = chain_of[chain_of[i]]
+            i = chain_of[i]
+        return i
+    
+    for overlap, i, j in overlaps:
+        if i in next_sequence or j in previous_sequence:
+            continue 
+        # Joining the end of a chain to its own start would make a cycle
+        if find_chain(i) == find_chain(j):
+            continue
+        
+        next_sequence[i] = (j, overlap)
+        previous_sequence[j] = i
+        chain_of[find_chain(j)] = find_chain(i)
+    
+    values = []
+    for i in range(len(kept)):
+        if i in previous_sequence:
+            continue 
+        
+        values.extend(kept[i])
+        while i in next_sequence:
+            i, overlap = next_sequence[i]
+            values.extend(kept[i][overlap:])
+    
+    index = SequenceIndex()
+    index.extend(values)
+    offsets = []
+    for sequence in sequences:
+        if len(sequence) == 0:
+            offsets.append(len(values))
+        else:
+            offsets.append(index.find(sequence))
+    
+    dedup_values, dedup_offsets = dedup_sequences(sequences)
+    if len(dedup_values) < len(values):
+        return dedup_values, dedup_offsets
+    
+    return values, offsets
+
+
+def find_single_value(in_list, value):
+    
+    return find_sequence(in_list, [value])
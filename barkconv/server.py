@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import sys
+import threading
+
+from .convert import convert_bytes, convert_file
+
+log = logging.getLogger(__name__)
+
+
+# Address of a conversion server: "-" for stdin/stdout, host:port for TCP or the path of a Unix socket
+def parse_address(address):
+    import socket
+    
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in host and "\\" not in host:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    
+    return socket.AF_UNIX, address
+
+
+# Whether every address that host resolves to is a loopback address, so that only this computer can connect
+def is_loopback(host):
+    import ipaddress
+    import socket
+    
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except OSError:
+        return False
+    return all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos)
+
+
+# Handles one request of the conversion server protocol. Requests and responses are json objects.
+# A request has either "input" (path of the file to convert) and optionally "output", or "data" 
+# (base64 encoded contents of the file to convert), plus the optional conversion options 
+# "packing", "compact_tangents" and "compact". "id" is copied to the response.
+# The response has "ok" and either "error", "output" (path of the written file) or 
+# "data" and "format" ("json" or "brk") of the converted file.
+def handle_request(request, cache=None):
+    import base64
+    
+    response = {"id": request.get("id"), "ok": True}
+    options = {}
+    for name in ("packing", "compact_tangents", "compact"):
+        if name in request:
+            options[name] = request[name]
+    
+    try:
+        if "data" in request:
+            result, brk_to_json = convert_bytes(base64.b64decode(request["data"]), cache=cache, **options)
+            response["format"] = "json" if brk_to_json else "brk"
+            response["data"] = base64.b64encode(result).decode("ascii")
+        else:
+            response["output"] = convert_file(request["input"], request.get("output"), cache=cache, **options)
+    except Exception as err:
+        response = {"id": request.get("id"), "ok": False, "error": "{0}: {1}".format(type(err).__name__, err)}
+    
+    return response
+
+
+# Long running process that converts files for clients, so that they don't have to start the 
+# converter for every file. Requests are handled concurrently on a pool of processes and
+# responses are sent when they are done, so they can come in a different order than the requests.
+class ConversionServer(object):
+    def __init__(self, jobs=None, cache=None):
+        from concurrent.futures import ProcessPoolExecutor
+        
+        self.executor = ProcessPoolExecutor(max_workers=jobs)
+        self.cache = cache
+    
+    # Start handling a line of the protocol, respond is called with the response when it is done
+    def submit(self, line, respond):
+        from concurrent.futures import Future
+        
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request needs to be a json object")
+        except ValueError as err:
+            future = Future()
+            future.set_result({"id": None, "ok": False, "error": "Invalid request: {0}".format(err)})
+        else:
+            future = self.executor.submit(handle_request, request, self.cache)
+        
+        # Callbacks run after waiters of the future are woken up, so return a future 
+        # that is only done once the response was sent.
+        responded = Future()
+        
+        def done(future):
+            try:
+                response = future.result()
+            except Exception as err:
+                response = {"id": request.get("id"), "ok": False, "error": "{0}: {1}".format(type(err).__name__, err)}
+            try:
+                respond(response)
+            finally:
+                responded.set_result(response)
+        
+        future.add_done_callback(done)
+        return responded
+    
+    def serve_stdio(self, stdin=None, stdout=None):
+        from concurrent.futures import wait
+        
+        stdin = stdin or sys.stdin
+        stdout = stdout or sys.stdout
+        lock = threading.Lock()
+        
+        def respond(response):
+            with lock:
+                stdout.write(json.dumps(response) + "\n")
+                stdout.flush()
+        
+        futures = [self.submit(line, respond) for line in stdin if line.strip()]
+        wait(futures)
+    
+    # Listen on a Unix socket or a TCP address. Clients can read and write any file the server can,
+    # so TCP addresses other than loopback ones are refused unless allow_remote is set.
+    def serve(self, address, allow_remote=False):
+        import socket
+        import socketserver
+        from concurrent.futures import wait
+        
+        family, address = parse_address(address)
+        if family == socket.AF_INET and not allow_remote and not is_loopback(address[0]):
+            raise RuntimeError(
+                "{0} isn't a loopback address, anyone who can connect to it could read and write files on this computer. "
+                "Use a loopback address like 127.0.0.1 or a Unix socket, or allow remote clients explicitly (--serve-remote).".format(address[0]))
+        
+        server = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lock = threading.Lock()
+                
+                def respond(response):
+                    with lock:
+                        try:
+                            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                            self.wfile.flush()
+                        except (OSError, ValueError):
+                            pass # Client went away
+                
+                futures = [server.submit(line.decode("utf-8"), respond) for line in self.rfile if line.strip()]
+                wait(futures)
+        
+        if family == socket.AF_INET:
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            server_class = socketserver.ThreadingTCPServer
+        else:
+            if os.path.exists(address):
+                os.remove(address)
+            server_class = socketserver.ThreadingUnixStreamServer
+        
+        with server_class(address, Handler) as socket_server:
+            if family != socket.AF_INET:
+                # Only for the user running the server
+                os.chmod(address, 0o600)
+            socket_server.daemon_threads = True
+            log.info("Listening on %s", address)
+            try:
+                socket_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                if family != socket.AF_INET:
+                    os.remove(address)
+    
+    def close(self):
+        self.executor.shutdown()
+
+
+# Sends conversions to a ConversionServer listening on a socket
+class ConversionClient(object):
+    def __init__(self, address):
+        import socket
+        
+        family, address = parse_address(address)
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(address)
+        except OSError:
+            self.socket.close()
+            raise 
+        self._file = self.socket.makefile("rwb")
+    
+    # Send all requests, then wait for all responses. Returns the responses in the order of the requests.
+    def request(self, requests):
+        for i, request in enumerate(requests):
+            request = dict(request, id=i)
+            self._file.write((json.dumps(request) + "\n").encode("utf-8"))
+        self._file.flush()
+        
+        responses = [None]*len(requests)
+        for i in range(len(requests)):
+            line = self._file.readline()
+            if not line:
+                raise RuntimeError("Connection to conversion server closed")
+            response = json.loads(line)
+            responses[response["id"]] = response
+        
+        return responses
+    
+    # Like convert_batch, items are (input, output) with output being None for the default output path
+    def convert_files(self, items, **options):
+        requests = []
+        for input, output in items:
+            request = dict(options, input=os.path.abspath(input))
+            if output is not None:
+                request["output"] = os.path.abspath(output)
+            requests.append(request)
+        
+        results = []
+        for (input, output), response in zip(items, self.request(requests)):
+            if response["ok"]:
+                results.append((input, response["output"], None))
+            else:
+                results.append((input, None, response["error"]))
+        
+        return results 
+    
+    # Like convert_bytes
+    def convert_bytes(self, data, **options):
+        import base64
+        
+        response = self.request([dict(options, data=base64.b64encode(data).decode("ascii"))])[0]
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        
+        return base64.b64decode(response["data"]), response["format"] == "json"
+    
+    def close(self):
+        self._file.close()
+        self.socket.close()
+    
+    def __enter__(self):
+        return self 
+    
+    def __exit__(self, *args):
+        self.close()
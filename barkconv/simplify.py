@@ -0,0 +1,139 @@
+import math
+
+from .brk import AnimTrack
+from .evaluate import evaluate_track, hermite_coefficients
+
+
+# Color value as the game sees it, rounded like bake_colors does
+def _round_color(val):
+    return min(0x7FFF, max(-0x8000, math.floor(val + 0.5)))
+
+
+def _clamp_tangent(val):
+    return min(0x7FFF, max(-0x8000, val))
+
+
+# Whether the segment from keyframe value p0 at time t0 to p1 at t0+length with the tangents
+# s0 and s1 stays within tolerance of the target colors at the given frames
+def _segment_fits(p0, p1, s0, s1, t0, length, frames, target, tolerance):
+    cf0, cf1, cf2, cf3 = hermite_coefficients(p0, p1, s0*length, s1*length)
+    scale = 1.0/length
+    
+    for frame in frames:
+        t = (frame - t0)*scale
+        if abs(_round_color(((cf0*t + cf1)*t + cf2)*t + cf3) - target[frame]) > tolerance:
+            return False
+    return True
+
+
+# Tangents for the segment that are closest to the target colors in the least squares sense.
+# The curve is linear in the tangents, so they are the solution of a 2x2 linear system. Tangents
+# are stored as integers, so every combination of rounding them down and up is returned.
+def _refit_tangents(p0, p1, t0, length, frames, target):
+    a11 = a12 = a22 = b1 = b2 = 0.0
+    
+    for frame in frames:
+        t = (frame - t0)/length
+        t2 = t*t
+        t3 = t2*t
+        h10 = t3 - 2*t2 + t
+        h11 = t3 - t2
+        rest = target[frame] - (2*t3 - 3*t2 + 1)*p0 - (3*t2 - 2*t3)*p1
+        
+        a11 += h10*h10
+        a12 += h10*h11
+        a22 += h11*h11
+        b1 += h10*rest
+        b2 += h11*rest
+    
+    det = a11*a22 - a12*a12
+    if abs(det) < 1e-12:
+        return []
+    
+    s0 = (b1*a22 - b2*a12)/det/length
+    s1 = (a11*b2 - a12*b1)/det/length
+    
+    return [(_clamp_tangent(out_tangent), _clamp_tangent(in_tangent))
+            for out_tangent in sorted({math.floor(s0), math.ceil(s0)})
+            for in_tangent in sorted({math.floor(s1), math.ceil(s1)})]
+
+
+# Outgoing tangent of keyframe i and ingoing tangent of keyframe j for a single segment from i to j
+# that replaces the keyframes between them, or None if there is none within tolerance
+def _fit_segment(track, i, j, target, tolerance):
+    t0, t1 = track.time[i], track.time[j]
+    p0, p1 = track.value[i], track.value[j]
+    length = t1 - t0
+    frames = range(max(t0, 0), min(t1, len(target)-1) + 1)
+    
+    candidates = [(track.tangentOut[i], track.tangentIn[j])]
+    candidates.extend(_refit_tangents(p0, p1, t0, length, frames, target))
+    
+    for out_tangent, in_tangent in candidates:
+        if _segment_fits(p0, p1, out_tangent, in_tangent, t0, length, frames, target, tolerance):
+            return out_tangent, in_tangent
+    
+    return None
+
+
+# A track with as few keyframes as possible whose rounded color at every frame from 0 to duration
+# differs by at most tolerance from that of the original track. A track whose color doesn't change
+# becomes a single keyframe, which is stored as a single value in the BRK. Otherwise keyframes
+# are removed greedily: from each kept keyframe, the segment is made to reach as far as possible,
+# with the original tangents or with tangents refitted to the skipped frames.
+def simplify_track(track, duration, tolerance=0):
+    if not isinstance(track, AnimTrack):
+        track = AnimTrack(track)
+    
+    if len(track) < 2:
+        return track
+    
+    times = track.time
+    if any(times[i] >= times[i+1] for i in range(len(track)-1)):
+        return track  # Unsorted keyframes are left to the game to sort out
+    
+    target = [_round_color(val) for val in evaluate_track(track, duration+1)]
+    
+    low, high = max(target) - tolerance, min(target) + tolerance
+    if low <= high:
+        simplified = AnimTrack()
+        simplified.add(0, min(max(track.value[0], low), high), 0, 0)
+        return simplified
+    
+    simplified = AnimTrack()
+    simplified.add(times[0], track.value[0], track.tangentIn[0], track.tangentOut[0])
+    
+    i = 0
+    last = len(track) - 1
+    while i < last:
+        end, out_tangent, in_tangent = i+1, track.tangentOut[i], track.tangentIn[i+1]
+        
+        for j in range(i+2, last+1):
+            tangents = _fit_segment(track, i, j, target, tolerance)
+            if tangents is None:
+                break
+            end, (out_tangent, in_tangent) = j, tangents
+        
+        simplified.tangentOut[-1] = out_tangent
+        simplified.add(times[end], track.value[end], in_tangent, track.tangentOut[end])
+        i = end
+    
+    return simplified
+
+
+# Simplify every color component of all animations of the BRK with simplify_track.
+# Returns the number of keyframes before and after.
+def simplify_brk(brk, tolerance=0):
+    before = after = 0
+    
+    for animations in (brk.register_animations, brk.constant_animations):
+        for anim in animations:
+            for comp in ("R", "G", "B", "A"):
+                track = anim.component[comp]
+                simplified = simplify_track(track, brk.duration, tolerance)
+                
+                before += len(track)
+                after += len(simplified)
+                anim.component[comp] = simplified
+    
+    return before, after
@@ -0,0 +1,243 @@
+import io
+import struct
+from collections import namedtuple
+
+from .brk import BRKFILEMAGIC, COLORANIM_ENTRY, TRK1_HEADER, BRKAnim, _hash_string
+from .convert import bom_encoding, run_parallel
+
+# A problem found in a BRK. severity is "error" for files that the converter or the game can't
+# use correctly and "warning" for files that work but probably not as intended. code is a short
+# name for the kind of problem, offset the position in the file it was found at (None for json files).
+Issue = namedtuple("Issue", ("severity", "code", "offset", "message"))
+
+# Range of color values the game uses: color registers are signed 10 bit, constant colors 8 bit
+COLOR_RANGES = {"register": (-1024, 1023), "constant": (0, 255)}
+
+
+class _Collector(object):
+    def __init__(self):
+        self.issues = []
+    
+    def error(self, code, offset, message, *args):
+        self.issues.append(Issue("error", code, offset, message.format(*args)))
+    
+    def warning(self, code, offset, message, *args):
+        self.issues.append(Issue("warning", code, offset, message.format(*args)))
+
+
+# Check that a range of bytes is inside the TRK1 section
+def _in_bounds(issues, start, length, end, what, field_offset):
+    if start < 0 or start + length > end:
+        issues.error("bounds", field_offset, "{0} at 0x{1:x} ({2} bytes) is outside of the TRK1 section, which ends at 0x{3:x}",
+                     what, start, length, end)
+        return False
+    return True
+
+
+# Names and hashes of a string table, or None if it is broken
+def _check_stringtable(issues, buffer, start, end, anim_count, animtype, field_offset):
+    if not _in_bounds(issues, start, 4, end, "{0} string table".format(animtype), field_offset):
+        return None
+    
+    count = struct.unpack_from(">H", buffer, start)[0]
+    if count != anim_count:
+        issues.error("stringtable", start, "{0} string table has {1} names for {2} animations", animtype, count, anim_count)
+    if not _in_bounds(issues, start + 4, count*4, end, "{0} string table entries".format(animtype), start):
+        return None
+    
+    entries = struct.unpack_from(">{0}H".format(count*2), buffer, start + 4)
+    names = []
+    
+    for i in range(count):
+        hash, offset = entries[i*2], entries[i*2+1]
+        name_start = start + offset
+        name_end = bytes(buffer[name_start:end]).find(b"\x00") if name_start < end else -1
+        if name_end == -1:
+            issues.error("stringtable", start + 4 + i*4, "{0} name {1} at 0x{2:x} isn't terminated inside the TRK1 section",
+                         animtype, i, name_start)
+            names.append(None)
+            continue
+        
+        try:
+            name = bytes(buffer[name_start:name_start+name_end]).decode("shift-jis")
+        except UnicodeDecodeError:
+            issues.error("stringtable", name_start, "{0} name {1} isn't valid Shift-JIS", animtype, i)
+            names.append(None)
+            continue
+        
+        if _hash_string(name) != hash:
+            issues.error("hash", start + 4 + i*4, "Hash 0x{0:04x} of {1} name {2!r} should be 0x{3:04x}, the game won't find the material",
+                         hash, animtype, name, _hash_string(name))
+        names.append(name)
+    
+    return names
+
+
+def _check_keyframes(issues, values, table_start, offset, count, tangent_type, duration, color_range, label):
+    if count == 1:
+        value = values[offset]
+        if not color_range[0] <= value <= color_range[1]:
+            issues.warning("range", table_start + offset*2, "{0}: color value {1} is outside of {2} to {3}",
+                           label, value, *color_range)
+        return
+    
+    stride = 3 if tangent_type == 0 else 4
+    times = values[offset:offset + count*stride:stride]
+    colors = values[offset + 1:offset + count*stride:stride]
+    
+    for i in range(1, count):
+        if times[i] <= times[i-1]:
+            issues.error("order", table_start + (offset + i*stride)*2, "{0}: keyframe {1} at frame {2} doesn't come after frame {3}",
+                         label, i, times[i], times[i-1])
+            break
+    
+    if times[0] < 0:
+        issues.warning("time", table_start + offset*2, "{0}: keyframe at negative frame {1}", label, times[0])
+    
+    late = sum(1 for time in times if time > duration)
+    if late:
+        issues.warning("duration", table_start + offset*2, "{0}: {1} keyframe(s) after the duration of {2} frames",
+                       label, late, duration)
+    
+    low, high = min(colors), max(colors)
+    if low < color_range[0] or high > color_range[1]:
+        issues.warning("range", table_start + (offset + 1)*2, "{0}: color values from {1} to {2} are outside of {3} to {4}",
+                       label, low, high, *color_range)
+
+
+# Check a BRK for everything that from_bytes relies on and for problems it doesn't notice:
+# header fields, offsets of all sections and tables, index arrays, string table hashes,
+# keyframes that don't fit their value table, keyframe order, keyframes after the duration
+# and color values the game can't use. Doesn't stop at the first problem, returns a list of Issues.
+def validate_bytes(buffer):
+    issues = _Collector()
+    size = len(buffer)
+    trk_start = 0x20
+    
+    if size < trk_start + TRK1_HEADER.size:
+        issues.error("header", 0, "File is too small for a BRK: {0} bytes", size)
+        return issues.issues
+    
+    magic = bytes(buffer[0:8])
+    if magic != BRKFILEMAGIC:
+        issues.error("header", 0, "Expected {0} but found {1}", BRKFILEMAGIC, magic)
+        return issues.issues
+    
+    file_size, section_count = struct.unpack_from(">II", buffer, 8)
+    if file_size != size:
+        issues.warning("header", 8, "File size in the header is {0} but the file has {1} bytes", file_size, size)
+    if section_count != 1:
+        issues.error("header", 12, "Expected 1 section but found {0}", section_count)
+    
+    (trk_magic, section_size, loop_mode, padd, duration,
+        register_count, constant_count, *fields) = TRK1_HEADER.unpack_from(buffer, trk_start)
+    if trk_magic != b"TRK1":
+        issues.error("header", trk_start, "Expected TRK1 section but found {0}", trk_magic)
+    if padd != 0xFF:
+        issues.error("padding", trk_start + 9, "Unexpected padding in TRK1 header: 0x{0:02x}", padd)
+    if loop_mode > 4:
+        issues.warning("header", trk_start + 8, "Unknown loop mode {0}", loop_mode)
+    
+    end = trk_start + section_size
+    if end > size:
+        issues.error("bounds", trk_start + 4, "TRK1 section of {0} bytes doesn't fit in the file", section_size)
+        end = size
+    
+    for i, (animtype, anim_count) in enumerate((("register", register_count), ("constant", constant_count))):
+        color_range = COLOR_RANGES[animtype]
+        entry_start, index_start, stringtable_start = (trk_start + fields[8 + i + k*2] for k in range(3))
+        
+        # Value tables
+        tables = []
+        for j, comp in enumerate(("R", "G", "B", "A")):
+            count = fields[i*4 + j]
+            table_start = trk_start + fields[14 + i*4 + j]
+            if _in_bounds(issues, table_start, count*2, end, "{0} {1} value table".format(animtype, comp), trk_start + 0x38 + (i*4 + j)*4):
+                tables.append((table_start, struct.unpack_from(">{0}h".format(count), buffer, table_start)))
+            else:
+                tables.append(None)
+        
+        # Index array
+        if _in_bounds(issues, index_start, anim_count*2, end, "{0} index array".format(animtype), trk_start + 0x28 + i*4):
+            indices = struct.unpack_from(">{0}H".format(anim_count), buffer, index_start)
+            for k, index in enumerate(indices):
+                if k != index:
+                    issues.error("index", index_start + k*2, "{0} index {1} is {2}", animtype, k, index)
+        
+        names = _check_stringtable(issues, buffer, stringtable_start, end, anim_count, animtype, trk_start + 0x30 + i*4)
+        
+        # Animation entries
+        if not _in_bounds(issues, entry_start, anim_count*COLORANIM_ENTRY.size, end,
+                          "{0} animation entries".format(animtype), trk_start + 0x20 + i*4):
+            continue
+        
+        seen = set()
+        for k in range(anim_count):
+            offset = entry_start + k*COLORANIM_ENTRY.size
+            entry = COLORANIM_ENTRY.unpack_from(buffer, offset)
+            name = names[k] if names is not None and k < len(names) and names[k] is not None else "#{0}".format(k)
+            
+            if entry[13] != b"\xFF\xFF\xFF":
+                issues.error("padding", offset + 25, "Unexpected padding in {0} animation {1}", animtype, name)
+            if (name, entry[12]) in seen:
+                issues.warning("duplicate", offset, "More than one {0} animation for {1}, color {2}", animtype, name, entry[12])
+            seen.add((name, entry[12]))
+            
+            for j, comp in enumerate(("R", "G", "B", "A")):
+                count, value_offset, tangent_type = entry[j*3:j*3+3]
+                label = "{0} {1} color {2} {3}".format(animtype, name, entry[12], comp)
+                
+                if count == 0:
+                    issues.warning("empty", offset + j*6, "{0} has no keyframes", label)
+                    continue
+                if tangent_type not in (0, 1):
+                    issues.error("tangent", offset + j*6 + 4, "{0} has unknown tangent type {1}", label, tangent_type)
+                    continue
+                if tables[j] is None:
+                    continue
+                
+                table_start, values = tables[j]
+                value_count = 1 if count == 1 else count*(3 if tangent_type == 0 else 4)
+                if value_offset + value_count > len(values):
+                    issues.error("bounds", offset + j*6 + 2, "{0}: {1} keyframes at {2} don't fit in the value table of {3} values",
+                                 label, count, value_offset, len(values))
+                    continue
+                
+                _check_keyframes(issues, values, table_start, value_offset, count, tangent_type, duration, color_range, label)
+    
+    return issues.issues
+
+
+# Validate a BRK or json file. A json file is read and then checked as the BRK it would be
+# converted to, its issues have no offset.
+def validate_file(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    
+    if data[:8] == BRKFILEMAGIC:
+        return validate_bytes(data)
+    
+    try:
+        brk = BRKAnim.from_json(io.StringIO(data.decode(bom_encoding(data))))
+        # Values that don't fit in their field are reported one by one instead of failing the conversion
+        range_errors = brk.range_errors()
+        if range_errors:
+            return [Issue("error", "range" if field in ("tevcolor", "konstcolor") else "header", None, message)
+                    for field, message in range_errors]
+        data = brk.to_bytes()
+    except (ValueError, KeyError, TypeError, RuntimeError) as err:
+        return [Issue("error", "json", None, "{0}: {1}".format(type(err).__name__, err))]
+    
+    return [issue._replace(offset=None) for issue in validate_bytes(data)]
+
+
+# Validate many files on a pool of processes (see run_parallel). Returns (path, issues) for every
+# path, a file that can't be read has a single "read" error.
+def validate_files(paths, jobs=None):
+    paths = list(paths)
+    results = []
+    for path, (issues, error) in zip(paths, run_parallel(validate_file, paths, jobs)):
+        if error is not None:
+            issues = [Issue("error", "read", None, error)]
+        results.append((path, issues))
+    return results
@@ -0,0 +1,180 @@
+import io
+import logging
+import os
+import struct
+import time
+
+from .brk import COLORANIM_ENTRY, AnimTrack, BRKAnim
+from .convert import bom_encoding
+
+log = logging.getLogger(__name__)
+
+
+# Encodes successive versions of a BRK, e.g. of a json file that is being edited. If only keyframe
+# values, color indices, the loop mode or the duration changed and every changed keyframe sequence
+# is used by no other animation in the value tables, the previous file is patched instead of
+# building the value tables again. A patched file decodes to the same animations as a full 
+# encoding, but can be less deduplicated.
+class IncrementalEncoder(object):
+    def __init__(self, packing="dedup", compact_tangents=False):
+        self.packing = packing
+        self.compact_tangents = compact_tangents
+        
+        self.data = None 
+        # Copy of the layout of the last full encoding. The BRKAnim passed to encode() belongs to the
+        # caller, who can change it or write it again, which would overwrite the offsets stored on it.
+        self._layout = None
+        self._animations = {} # animtype: [(name, colornum)] of every animation
+        self._components = {} # (animtype, animation index, color component): (offset in the value table, tangent type, keyframe count, sequence)
+    
+    # Returns the encoded BRK and the number of animations that were patched, 
+    # or None if the whole file was encoded again
+    def encode(self, brk):
+        if self.data is not None:
+            updated = self._patch(brk)
+            if updated is not None:
+                return self.data, updated
+        
+        data = brk.to_bytes(self.packing, self.compact_tangents)
+        
+        animations = {}
+        components = {}
+        for animtype, anims in (("register", brk.register_animations), ("constant", brk.constant_animations)):
+            animations[animtype] = [(anim.name, anim.colornum) for anim in anims]
+            for i, anim in enumerate(anims):
+                for comp in ("R", "G", "B", "A"):
+                    track = anim.component[comp]
+                    if not isinstance(track, AnimTrack):
+                        track = AnimTrack(track)
+                    tangent_type = anim._tangent_type[comp]
+                    components[(animtype, i, comp)] = (anim._component_offsets[comp], tangent_type, len(track), track.to_sequence(tangent_type))
+        
+        self.data = data
+        self._layout = {"animations": dict(brk._layout["animations"]), "values": dict(brk._layout["values"])}
+        self._animations = animations
+        self._components = components
+        
+        return self.data, None
+    
+    # Whether the value table range of an animation's color component overlaps with no other animation
+    def _is_exclusive(self, animtype, index, comp):
+        start, tangent_type, count, sequence = self._components[(animtype, index, comp)]
+        end = start + len(sequence)
+        
+        for i in range(len(self._animations[animtype])):
+            if i == index:
+                continue 
+            other_start, tangent_type, count, sequence = self._components[(animtype, i, comp)]
+            other_end = other_start + len(sequence)
+            
+            if other_start < other_end and start < other_end and other_start < end:
+                return False 
+        
+        return True 
+    
+    def _patch(self, brk):
+        # Encoding it again raises the error
+        if brk.range_errors():
+            return None
+        
+        value_changes = []
+        entry_changes = []
+        
+        for animtype, new_animations in (("register", brk.register_animations), ("constant", brk.constant_animations)):
+            old_animations = self._animations[animtype]
+            if len(old_animations) != len(new_animations):
+                return None 
+            
+            for i, ((name, colornum), new_anim) in enumerate(zip(old_animations, new_animations)):
+                if name != new_anim.name:
+                    return None 
+                
+                if colornum != new_anim.colornum:
+                    entry_changes.append((animtype, i, new_anim.colornum))
+                
+                for comp in ("R", "G", "B", "A"):
+                    offset, tangent_type, count, old_sequence = self._components[(animtype, i, comp)]
+                    track = new_anim.component[comp]
+                    if not isinstance(track, AnimTrack):
+                        track = AnimTrack(track)
+                    
+                    if len(track) != count:
+                        return None 
+                    if tangent_type == 0 and track.tangentIn != track.tangentOut:
+                        return None
+                    
+                    sequence = track.to_sequence(tangent_type)
+                    if sequence != old_sequence:
+                        if not self._is_exclusive(animtype, i, comp):
+                            return None 
+                        value_changes.append((animtype, i, comp, sequence))
+        
+        # Everything can be patched, nothing was changed before this point
+        layout = self._layout
+        trk1_start = 0x20
+        struct.pack_into(">BBH", self.data, trk1_start + 8, brk.loop_mode, 0xFF, brk.duration)
+        
+        for animtype, i, colornum in entry_changes:
+            struct.pack_into(">B", self.data, layout["animations"][animtype] + COLORANIM_ENTRY.size*i + 24, colornum)
+            self._animations[animtype][i] = (self._animations[animtype][i][0], colornum)
+        
+        for animtype, i, comp, sequence in value_changes:
+            offset, tangent_type, count, old_sequence = self._components[(animtype, i, comp)]
+            struct.pack_into(">{0}h".format(len(sequence)), self.data, layout["values"][(animtype, comp)] + offset*2, *sequence)
+            self._components[(animtype, i, comp)] = (offset, tangent_type, count, sequence)
+        
+        updated = set((animtype, i) for animtype, i, colornum in entry_changes)
+        updated.update((animtype, i) for animtype, i, comp, sequence in value_changes)
+        
+        return len(updated)
+
+
+# Watch json files and write <input>.brk (or the path in outputs) whenever one of them changes.
+# Runs until interrupted.
+def watch(inputs, outputs=None, interval=0.5, packing="dedup", compact_tangents=False):
+    if outputs is None:
+        outputs = {}
+    
+    encoders = {}
+    seen = {}
+    
+    log.info("Watching %d file(s), press Ctrl+C to stop.", len(inputs))
+    try:
+        while True:
+            for input in inputs:
+                try:
+                    stat = os.stat(input)
+                except OSError:
+                    continue 
+                
+                state = (stat.st_mtime_ns, stat.st_size)
+                if seen.get(input) == state:
+                    continue 
+                seen[input] = state 
+                
+                output = outputs.get(input, input+".brk")
+                start = time.perf_counter()
+                try:
+                    with open(input, "rb") as f:
+                        data = f.read()
+                    brk = BRKAnim.from_json(io.StringIO(data.decode(bom_encoding(data))))
+                    
+                    if input not in encoders:
+                        encoders[input] = IncrementalEncoder(packing, compact_tangents)
+                    result, updated = encoders[input].encode(brk)
+                    
+                    with open(output, "wb") as f:
+                        f.write(result)
+                except Exception as err:
+                    log.error("Failed to rebuild %s: %s: %s", output, type(err).__name__, err)
+                    continue 
+                
+                if updated is None:
+                    how = "full rebuild"
+                else:
+                    how = "patched {0} animation(s)".format(updated)
+                log.info("Wrote %s (%s, %.1f ms)", output, how, (time.perf_counter() - start)*1000)
+            
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,238 @@
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import barkconv
+
+
+# name: (materials, keyframes per component, fraction of components that share a curve)
+SCALES = {
+    "small":        (8, 4, 0.5),
+    "medium":       (64, 8, 0.5),
+    "large":        (256, 16, 0.5),
+    "unique":       (256, 16, 0.0),
+    "shared":       (256, 16, 1.0),
+    "manykeys":     (16, 256, 0.5),
+}
+
+
+# Keyframes with equal incoming and outgoing tangents if same_tangents is True, different ones
+# if it is False and a random mix of both if it is None
+def make_curve(rnd, keyframes, same_tangents=None):
+    curve = []
+    time = 0
+    for i in range(keyframes):
+        tangent = rnd.randint(-8, 8)
+        same = rnd.random() < 0.5 if same_tangents is None else same_tangents
+        if same:
+            curve.append((time, rnd.randint(0, 255), tangent, tangent))
+        else:
+            curve.append((time, rnd.randint(0, 255), tangent, rnd.randint(-8, 8)))
+        time += rnd.randint(1, 10)
+    return curve
+
+
+# A BRK with register and constant animations for the given number of materials.
+# shared is the fraction of color components that use one of a few common curves
+# instead of a curve of their own. With mixed (for the tests), the other components are
+# single keyframes, empty or curves whose tangents are all equal (sometimes apart from the
+# last keyframe) or all different, and so are the common curves.
+def make_brk(materials, keyframes, shared, seed=0, mixed=False):
+    rnd = random.Random(seed)
+    if mixed:
+        common = [make_curve(rnd, keyframes, i % 2 == 0) for i in range(8)]
+    else:
+        common = [make_curve(rnd, keyframes) for i in range(8)]
+
+    brk = barkconv.BRKAnim(2, keyframes*10)
+    for animations in (brk.register_animations, brk.constant_animations):
+        for i in range(materials):
+            anim = barkconv.ColorAnimation(i, "material_{0}".format(i), i % 4)
+            for comp in ("R", "G", "B", "A"):
+                if rnd.random() < shared:
+                    curve = rnd.choice(common)
+                elif mixed:
+                    curve = _mixed_curve(rnd, keyframes)
+                else:
+                    curve = make_curve(rnd, keyframes)
+
+                for keyframe in curve:
+                    anim.component[comp].add(*keyframe)
+            animations.append(anim)
+
+    return brk
+
+
+def _mixed_curve(rnd, keyframes):
+    kind = rnd.randrange(4)
+    if kind == 0:
+        return [(0, rnd.randint(0, 255), 0, 0)]
+    if kind == 1:
+        return []
+
+    curve = make_curve(rnd, rnd.randint(2, keyframes), kind == 2)
+    if kind == 2 and rnd.random() < 0.3:
+        time, value, tangent, out_tangent = curve[-1]
+        curve[-1] = (time, value, tangent, tangent + 1)
+    return curve
+
+
+def measure(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def run_scale(name, materials, keyframes, shared, repeat):
+    brk = make_brk(materials, keyframes, shared)
+    data = bytes(brk.to_bytes())
+
+    text = io.StringIO()
+    brk.dump(text)
+    text = text.getvalue()
+
+    results = {}
+    results["from_brk"] = measure(lambda: barkconv.BRKAnim.from_brk(io.BytesIO(data)), repeat)
+    results["write_brk"] = measure(lambda: brk.write_brk(io.BytesIO()), repeat)
+    results["dump"] = measure(lambda: brk.dump(io.StringIO()), repeat)
+    results["from_json"] = measure(lambda: barkconv.BRKAnim.from_json(io.StringIO(text)), repeat)
+
+    return {
+        "materials": materials, "keyframes": keyframes, "shared": shared,
+        "brk_bytes": len(data), "json_bytes": len(text),
+        "operations": results
+    }
+
+
+# Modules that importing barkconv and reading a BRK shouldn't load
+HEAVY_MODULES = ("json", "argparse", "concurrent.futures", "socketserver", "hashlib", "mmap", "math")
+
+# Run in a fresh interpreter: time the import, read the BRK from stdin and list the heavy modules that got loaded
+IMPORT_CHECK = """
+import sys, time
+start = time.perf_counter()
+import barkconv
+elapsed = time.perf_counter() - start
+barkconv.load_brk(sys.stdin.buffer.read())
+print(elapsed, *[name for name in {0!r} if name in sys.modules])
+""".format(HEAVY_MODULES)
+
+
+def measure_import(data, repeat):
+    best = None
+    loaded = set()
+    for i in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_CHECK], input=data, stdout=subprocess.PIPE, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.decode("ascii").split()
+        
+        elapsed = float(output[0])
+        if best is None or elapsed < best:
+            best = elapsed
+        loaded.update(output[1:])
+    
+    return {"seconds": best, "loaded": sorted(loaded)}
+
+
+# Returns a line for every operation that got slower than the baseline by more than threshold
+def compare(results, baseline, threshold):
+    regressions = []
+    for scale, result in results["scales"].items():
+        if scale not in baseline["scales"]:
+            continue
+
+        for operation, numbers in result["operations"].items():
+            old = baseline["scales"][scale]["operations"].get(operation)
+            if old is None or old["seconds"] == 0:
+                continue
+
+            change = numbers["seconds"]/old["seconds"] - 1
+            if change > threshold:
+                regressions.append("{0} {1}: {2:.4f}s -> {3:.4f}s (+{4:.0%})".format(
+                    scale, operation, old["seconds"], numbers["seconds"], change))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time reading, writing, dumping and loading of synthetic BRKs.")
+    parser.add_argument("--scales", default=",".join(SCALES),
+                        help="Comma separated list of scales to run. Available: {0}".format(", ".join(SCALES)))
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs per operation, the fastest one is reported.")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Write the results as json to this file.")
+    parser.add_argument("--compare", default=None, metavar="BASELINE",
+                        help="Json results of an earlier run. Slower operations are reported and the exit code is 1.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="How much slower than the baseline an operation can get before it counts as a regression. Default: 0.2 (20%%)")
+    parser.add_argument("--import-budget", type=float, default=100, metavar="MS",
+                        help=(
+                            "Time that importing barkconv in a new interpreter may take, in milliseconds. "
+                            "Going over it, or loading json or other modules not needed for reading a BRK, "
+                            "makes the exit code 1. Default: 100"
+                        ))
+
+    args = parser.parse_args()
+
+    results = {"python": sys.version.split()[0], "scales": {}}
+    for name in args.scales.split(","):
+        if name not in SCALES:
+            parser.error("unknown scale: {0}".format(name))
+
+        result = run_scale(name, *SCALES[name], repeat=args.repeat)
+        results["scales"][name] = result
+
+        for operation, numbers in result["operations"].items():
+            print("{0:<10} {1:<10} {2:>10.4f}s {3:>10.1f} KiB peak".format(
+                name, operation, numbers["seconds"], numbers["peak_bytes"]/1024))
+
+    small = bytes(make_brk(*SCALES["small"]).to_bytes())
+    results["import"] = measure_import(small, args.repeat)
+    print("{0:<21} {1:>10.4f}s {2}".format(
+        "import", results["import"]["seconds"], " ".join(results["import"]["loaded"])))
+    
+    failed = False
+    if results["import"]["seconds"]*1000 > args.import_budget:
+        print("Importing barkconv took longer than the budget of {0} ms".format(args.import_budget))
+        failed = True
+    if results["import"]["loaded"]:
+        print("Reading a BRK loaded:", ", ".join(results["import"]["loaded"]))
+        failed = True
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print("Regression:", regression)
+
+        if regressions:
+            failed = True
+        else:
+            print("No regressions.")
+    
+    if failed:
+        sys.exit(1)
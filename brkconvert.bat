@@ -1,2 +1,2 @@
-python "%~dp0bark-conv.py" %1
+python "%~dp0bark-conv.py" --batch %*
 pause
\ No newline at end of file
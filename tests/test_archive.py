@@ -0,0 +1,155 @@
+import random
+import unittest
+
+from barkconv import BRKAnim, RARC, is_archive, yaz0_compress, yaz0_decompress
+from barkconv.archive import (
+    ARCHIVE_ARAM, ARCHIVE_COMPRESSED, ARCHIVE_DIRECTORY, ARCHIVE_FILE, ARCHIVE_MRAM, ARCHIVE_YAZ0,
+    RARC_ENTRY, RARC_HEADER, RARC_INFO, RARC_NODE, YAZ0_HEADER, align32
+)
+from barkconv.brk import _hash_string
+
+import benchmark
+
+
+class Yaz0Test(unittest.TestCase):
+    def test_roundtrip(self):
+        rnd = random.Random(0)
+        literal = bytes(rnd.randrange(256) for i in range(3000))
+        repetitive = b"".join(rnd.choice((b"abc", b"brk", b"\x00\x01\x02\x03")) for i in range(2000))
+        # Runs longer than the distance of their back reference and longer than the longest match
+        runs = b"x" + b"a"*1000 + b"ab"*300 + bytes(0x111*3) + b"y"
+        
+        for data in (b"", b"a", b"ab", literal, repetitive, runs, literal + runs + literal, bytes(benchmark.make_brk(8, 4, 0.5).to_bytes())):
+            compressed = yaz0_compress(data)
+            self.assertEqual(yaz0_decompress(compressed), data)
+            self.assertEqual(yaz0_decompress(compressed, 5), data[:5])
+        
+        self.assertLess(len(yaz0_compress(repetitive)), len(repetitive)//2)
+        self.assertLess(len(yaz0_compress(runs)), 100)
+    
+    def test_decompress_overlapping_back_reference(self):
+        # "a", then 10 bytes from 1 byte back and 0x20 bytes from 2 bytes back (3 byte form)
+        data = YAZ0_HEADER.pack(b"Yaz0", 0x2B) + bytes((0b10000000,)) + b"a" + bytes((0x80, 0x00, 0x00, 0x01, 0x20 - 0x12))
+        self.assertEqual(yaz0_decompress(data), b"a"*0x2B)
+    
+    def test_broken_data(self):
+        with self.assertRaises(RuntimeError):
+            yaz0_decompress(b"RARC")
+        with self.assertRaises(RuntimeError):
+            yaz0_decompress(yaz0_compress(b"abcabcabcabc")[:-2])
+        with self.assertRaises(RuntimeError):
+            # Back reference before the start of the data
+            yaz0_decompress(YAZ0_HEADER.pack(b"Yaz0", 4) + bytes((0, 0x20, 0x05)))
+
+
+# A RARC with root/{a.brk, data.bin, anim/{b.brk (Yaz0 compressed), c.txt (ARAM)}}
+def make_rarc(a, b):
+    strings = bytearray(b".\x00..\x00")
+    
+    def name(string):
+        offset = len(strings)
+        strings.extend(string.encode("ascii") + b"\x00")
+        return offset
+    
+    files = bytearray()
+    
+    def file_entry(file_id, filename, data, flags):
+        offset = len(files)
+        files.extend(data)
+        files.extend(bytes(align32(len(files)) - len(files)))
+        return RARC_ENTRY.pack(file_id, _hash_string(filename), (flags | ARCHIVE_FILE) << 24 | name(filename), offset, len(data))
+    
+    def dir_entry(dirname, name_offset, node):
+        return RARC_ENTRY.pack(0xFFFF, _hash_string(dirname), ARCHIVE_DIRECTORY << 24 | name_offset, node, 0x10)
+    
+    root_name, anim_name = name("root"), name("anim")
+    root_entries = [
+        file_entry(0, "a.brk", a, ARCHIVE_MRAM),
+        file_entry(1, "data.bin", b"\x01\x02\x03"*50, ARCHIVE_MRAM),
+        dir_entry("anim", anim_name, 1),
+        dir_entry(".", 0, 0),
+        dir_entry("..", 2, 0xFFFFFFFF),
+    ]
+    anim_entries = [
+        file_entry(5, "b.brk", yaz0_compress(b), ARCHIVE_MRAM | ARCHIVE_COMPRESSED | ARCHIVE_YAZ0),
+        file_entry(6, "c.txt", b"hello", ARCHIVE_ARAM),
+        dir_entry(".", 0, 1),
+        dir_entry("..", 2, 0),
+    ]
+    
+    nodes = RARC_NODE.pack(b"ROOT", root_name, _hash_string("root"), len(root_entries), 0)
+    nodes += RARC_NODE.pack(b"ANIM", anim_name, _hash_string("anim"), len(anim_entries), len(root_entries))
+    nodes += bytes(align32(len(nodes)) - len(nodes))
+    entries = b"".join(root_entries + anim_entries)
+    entries += bytes(align32(len(entries)) - len(entries))
+    strings.extend(bytes(align32(len(strings)) - len(strings)))
+    
+    node_offset = RARC_INFO.size
+    entry_offset = node_offset + len(nodes)
+    string_offset = entry_offset + len(entries)
+    data_offset = string_offset + len(strings)
+    
+    info = RARC_INFO.pack(2, node_offset, len(root_entries) + len(anim_entries), entry_offset,
+                          len(strings), string_offset, 7, 0)
+    header = RARC_HEADER.pack(b"RARC", RARC_HEADER.size + data_offset + len(files), RARC_HEADER.size,
+                              data_offset, len(files), len(files) - 0x20, 0x20)
+    return header + info + nodes + entries + bytes(strings) + bytes(files)
+
+
+class RARCTest(unittest.TestCase):
+    def setUp(self):
+        self.a = bytes(benchmark.make_brk(8, 4, 0.5, seed=1).to_bytes())
+        self.b = bytes(benchmark.make_brk(8, 4, 0.5, seed=2).to_bytes())
+        self.data = make_rarc(self.a, self.b)
+    
+    def test_read(self):
+        for data in (self.data, yaz0_compress(self.data)):
+            self.assertTrue(is_archive(data))
+            rarc = RARC.from_bytes(data)
+            self.assertEqual([file.path for file in rarc.files], ["a.brk", "data.bin", "anim/b.brk", "anim/c.txt"])
+            self.assertEqual([file.path for file in rarc.brk_files()], ["a.brk", "anim/b.brk"])
+            self.assertTrue(rarc.find("anim/b.brk").is_compressed())
+            self.assertEqual(rarc.find("anim/b.brk").contents(), self.b)
+            self.assertEqual(rarc.find("anim/c.txt").contents(), b"hello")
+            self.assertEqual(rarc.to_bytes(compress=False), self.data)
+    
+    def test_replace_brk(self):
+        for compressed in (False, True):
+            rarc = RARC.from_bytes(yaz0_compress(self.data) if compressed else self.data)
+            new_a = benchmark.make_brk(64, 8, 0.5, seed=3)
+            new_b = benchmark.make_brk(2, 2, 0.5, seed=4)
+            rarc.replace_brk("a.brk", new_a)
+            rarc.replace_brk("anim/b.brk", new_b, "overlap")
+            with self.assertRaises(RuntimeError):
+                rarc.replace_brk("anim/missing.brk", new_b)
+            
+            data = rarc.to_bytes()
+            self.assertEqual(data[:4], b"Yaz0" if compressed else b"RARC")
+            rarc = RARC.from_bytes(data)
+            data = yaz0_decompress(data) if compressed else data
+            
+            self.assertEqual([file.path for file in rarc.files], ["a.brk", "data.bin", "anim/b.brk", "anim/c.txt"])
+            self.assertEqual(rarc.find("a.brk").contents(), new_a.to_bytes())
+            self.assertEqual(rarc.find("anim/b.brk").contents(), new_b.to_bytes("overlap"))
+            self.assertTrue(rarc.find("anim/b.brk").is_compressed())
+            self.assertEqual(rarc.find("data.bin").contents(), b"\x01\x02\x03"*50)
+            self.assertEqual(rarc.find("anim/c.txt").contents(), b"hello")
+            for path, brk in rarc.brks():
+                self.assertIsInstance(brk, BRKAnim)
+            
+            magic, size, header_size, data_offset, data_size, mram_size, aram_size = RARC_HEADER.unpack_from(data)
+            self.assertEqual(size, len(data))
+            self.assertEqual(data_size, len(data) - header_size - data_offset)
+            self.assertEqual(mram_size, sum(align32(len(rarc.find(path).data)) for path in ("a.brk", "data.bin", "anim/b.brk")))
+            self.assertEqual(aram_size, align32(len(b"hello")))
+            # Files loaded to ARAM stay after the ones loaded to MRAM
+            offsets = {}
+            for i in range(9):
+                entry = RARC_ENTRY.unpack_from(data, rarc._entries_start + i*RARC_ENTRY.size)
+                if entry[2] >> 24 & ARCHIVE_FILE:
+                    offsets[entry[0]] = entry[3]
+            self.assertEqual(sorted(offsets, key=offsets.get), [0, 1, 5, 6])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import random
+import struct
+import unittest
+
+from barkconv import AnimComponent, AnimTrack, BRKAnim
+from barkconv.brk import read_cstring
+
+import benchmark
+
+
+def make_brk():
+    return benchmark.make_brk(4, 3, 0.5, mixed=True)
+
+
+class AnimTrackTest(unittest.TestCase):
+    def test_bad_values_leave_track_unchanged(self):
+        track = AnimTrack([AnimComponent(0, 1, 2, 3)])
+        
+        with self.assertRaises(RuntimeError):
+            track.insert(0, AnimComponent(5, 70000, 0))
+        with self.assertRaises(RuntimeError):
+            track[0] = AnimComponent(5, 1, 0, "x")
+        with self.assertRaises(RuntimeError):
+            track.append(AnimComponent(5, 1, 0, -40000))
+        
+        self.assertEqual(list(track.rows()), [(0, 1, 2, 3)])
+        self.assertEqual([len(column) for column in (track.time, track.value, track.tangentIn, track.tangentOut)], [1, 1, 1, 1])
+
+
+
+class StringTableTest(unittest.TestCase):
+    def test_find_animations_with_wrong_stored_hash(self):
+        data = bytearray(make_brk().to_bytes())
+        stringtable = 0x20 + struct.unpack_from(">I", data, 0x20 + 0x30)[0]
+        # Hash of the second register name
+        struct.pack_into(">H", data, stringtable + 8, 0x1234)
+        
+        for lazy in (False, True):
+            brk = BRKAnim.from_bytes(bytes(data), lazy)
+            self.assertEqual([anim.name for anim in brk.find_animations("material_1")], ["material_1"])
+
+
+class RangeTest(unittest.TestCase):
+    def test_fields_that_dont_fit_raise_runtime_error(self):
+        for field, value in (("loop_mode", 300), ("duration", 70000), ("colornum", -1)):
+            brk = make_brk()
+            if field == "colornum":
+                brk.constant_animations[2].colornum = value
+            else:
+                setattr(brk, field, value)
+            
+            with self.assertRaises(RuntimeError):
+                brk.to_bytes()
+            self.assertEqual(len(brk.range_errors()), 1)
+        
+        self.assertEqual(make_brk().range_errors(), [])
+
+
+class BrokenBRKTest(unittest.TestCase):
+    def test_read_cstring_needs_terminator(self):
+        self.assertEqual(read_cstring(b"ab\x00c", 0), b"ab")
+        self.assertEqual(read_cstring(memoryview(b"ab\x00c"), 0), b"ab")
+        for buffer in (b"abc", memoryview(b"abc")):
+            with self.assertRaises(RuntimeError):
+                read_cstring(buffer, 1)
+    
+    def test_single_keyframe_outside_of_table(self):
+        with self.assertRaises(RuntimeError):
+            AnimTrack.from_array(3, 1, (1, 2, 3), 1)
+    
+    def test_corrupted_files_raise_runtime_error(self):
+        data = bytes(make_brk().to_bytes())
+        rnd = random.Random(0)
+        
+        for trial in range(2000):
+            corrupted = bytearray(data)
+            for i in range(rnd.randint(1, 6)):
+                corrupted[rnd.randrange(0x20, len(corrupted))] = rnd.randrange(256)
+            if rnd.random() < 0.2:
+                corrupted = corrupted[:rnd.randrange(len(corrupted))]
+            
+            for lazy in (False, True):
+                try:
+                    brk = BRKAnim.from_bytes(bytes(corrupted), lazy)
+                    list(brk.register_animations) + list(brk.constant_animations)
+                except RuntimeError:
+                    pass
+
+
+if __name__ == "__main__":
+    unittest.main()
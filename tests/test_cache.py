@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+from barkconv import ConversionCache
+
+
+class CountingCache(ConversionCache):
+    walks = 0
+    
+    def _entries(self):
+        self.walks += 1
+        return super(CountingCache, self)._entries()
+
+
+class ConversionCacheTest(unittest.TestCase):
+    def test_eviction_leaves_room(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = CountingCache(directory, 1000)
+            for i in range(200):
+                cache.put(cache.key(str(i).encode("ascii"), {}), bytes(100))
+            
+            sizes = [os.path.getsize(os.path.join(dirpath, filename)) 
+                     for dirpath, dirnames, filenames in os.walk(directory) for filename in filenames]
+            self.assertLessEqual(sum(sizes), 1000)
+            # The first write and one eviction every few writes, not one for every write
+            self.assertLess(cache.walks, 200//2)
+    
+    def test_writing_an_entry_again(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = CountingCache(directory, 1000)
+            key = cache.key(b"anim", {})
+            for i in range(50):
+                cache.put(key, bytes(300))
+            
+            self.assertEqual(cache._size, 300)
+            self.assertEqual(cache.walks, 1)
+            self.assertEqual(cache.get(key), bytes(300))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import importlib.util
+import os
+import unittest
+
+import benchmark
+
+# Top-level classes, functions and constants of the old single-file bark-conv.py
+OLD_NAMES = (
+    "BRKFILEMAGIC", "PADDING", "read_uint32", "read_uint16", "read_sint16", "read_uint8", "read_sint8", "read_float",
+    "write_uint32", "write_uint16", "write_sint16", "write_uint8", "write_sint8", "write_float", "write_padding",
+    "opt_round", "write_indented", "find_sequence", "find_single_value",
+    "StringTable", "AnimComponent", "ColorAnimation", "BRKAnim"
+)
+
+
+class ImportTest(unittest.TestCase):
+    # Budget for importing barkconv in a new interpreter, like benchmark.py --import-budget
+    IMPORT_BUDGET = 0.1
+    
+    def test_import_time_and_modules(self):
+        result = benchmark.measure_import(bytes(benchmark.make_brk(*benchmark.SCALES["small"]).to_bytes()), 3)
+        self.assertEqual(result["loaded"], [])
+        self.assertLess(result["seconds"], self.IMPORT_BUDGET)
+    
+    def test_script_has_old_names(self):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bark-conv.py")
+        spec = importlib.util.spec_from_file_location("bark_conv", path)
+        script = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(script)
+        
+        for name in OLD_NAMES:
+            self.assertTrue(hasattr(script, name), name)
+        self.assertEqual(script.find_sequence([1, 2, 3, 2, 3], [2, 3]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
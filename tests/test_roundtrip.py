@@ -0,0 +1,74 @@
+import unittest
+
+import barkconv
+from barkconv.brk import COLORANIM_ENTRY, TRK1_HEADER
+
+import benchmark
+
+
+# A BRK with a mix of tracks that can and can't use tangent type 0, single keyframes,
+# empty tracks and curves shared between components
+def make_brk(seed=0):
+    return benchmark.make_brk(24, 8, 0.2, seed, mixed=True)
+
+
+def keyframes(brk):
+    return [
+        [(anim.name, anim.colornum, comp, list(anim.component[comp].rows())) for anim in animations for comp in ("R", "G", "B", "A")]
+        for animations in (brk.register_animations, brk.constant_animations)
+    ]
+
+
+# Tangent type of every component of every animation, read from the entries in a BRK
+def tangent_types(data):
+    fields = TRK1_HEADER.unpack_from(data, 0x20)
+    register_count, constant_count = fields[5], fields[6]
+    
+    types = []
+    for count, offset in ((register_count, fields[15]), (constant_count, fields[16])):
+        for i in range(count):
+            entry = COLORANIM_ENTRY.unpack_from(data, 0x20 + offset + COLORANIM_ENTRY.size*i)
+            types.append([entry[j*3+2] for j in range(4)])
+    return types
+
+
+class CompactTangentsTest(unittest.TestCase):
+    def test_roundtrip_gives_same_keyframes(self):
+        brk = make_brk()
+        expected = keyframes(brk)
+        
+        for packing in ("dedup", "overlap"):
+            with self.subTest(packing=packing):
+                full = brk.to_bytes(packing)
+                compact = brk.to_bytes(packing, compact_tangents=True)
+                self.assertLess(len(compact), len(full))
+                
+                self.assertEqual(keyframes(barkconv.BRKAnim.from_bytes(compact)), expected)
+                self.assertEqual(keyframes(barkconv.BRKAnim.from_bytes(compact, lazy=True)), expected)
+                self.assertEqual(keyframes(barkconv.BRKAnim.from_bytes(full)), expected)
+    
+    def test_tangent_type_0_only_for_equal_tangents(self):
+        brk = make_brk(1)
+        
+        for packing in ("dedup", "overlap"):
+            with self.subTest(packing=packing):
+                types = tangent_types(brk.to_bytes(packing, compact_tangents=True))
+                animations = brk.register_animations + brk.constant_animations
+                self.assertEqual(len(types), len(animations))
+                
+                for anim, anim_types in zip(animations, types):
+                    for comp, tangent_type in zip(("R", "G", "B", "A"), anim_types):
+                        track = anim.component[comp]
+                        equal = len(track) > 1 and all(keyframe[2] == keyframe[3] for keyframe in track.rows())
+                        self.assertEqual(tangent_type, 0 if equal else 1, (anim.name, comp, list(track.rows())))
+                
+                self.assertTrue(any(0 in anim_types for anim_types in types))
+                self.assertTrue(any(1 in anim_types for anim_types in types))
+    
+    def test_default_uses_tangent_type_1(self):
+        types = tangent_types(make_brk().to_bytes())
+        self.assertEqual({tangent_type for anim_types in types for tangent_type in anim_types}, {1})
+
+
+if __name__ == "__main__":
+    unittest.main()
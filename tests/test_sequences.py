@@ -0,0 +1,39 @@
+import random
+import unittest
+
+from barkconv.sequences import SequenceIndex, dedup_sequences, find_sequence, pack_sequences
+
+
+def check_offsets(test, sequences, values, offsets):
+    for sequence, offset in zip(sequences, offsets):
+        test.assertEqual(values[offset:offset+len(sequence)], list(sequence))
+
+
+class SequenceTest(unittest.TestCase):
+    def test_index_finds_first_start(self):
+        rnd = random.Random(0)
+        for trial in range(500):
+            index = SequenceIndex()
+            values = []
+            for i in range(10):
+                sequence = [rnd.randint(0, 2) for j in range(rnd.randint(0, 6))]
+                self.assertEqual(index.find(sequence), find_sequence(values, sequence))
+                index.extend(sequence)
+                values.extend(sequence)
+    
+    def test_overlap_is_never_longer_than_dedup(self):
+        sequences = [[1, 1, 1, 2], [1, 0, 2, 1], [2, 1, 0], [1]]
+        values, offsets = pack_sequences(sequences)
+        self.assertEqual(len(values), len(dedup_sequences(sequences)[0]))
+        check_offsets(self, sequences, values, offsets)
+        
+        rnd = random.Random(1)
+        for trial in range(2000):
+            sequences = [[rnd.randint(0, 2) for j in range(rnd.randint(0, 5))] for i in range(rnd.randint(1, 6))]
+            values, offsets = pack_sequences(sequences)
+            self.assertLessEqual(len(values), len(dedup_sequences(sequences)[0]))
+            check_offsets(self, sequences, values, offsets)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+from barkconv.server import ConversionServer, is_loopback
+
+
+class ServeTest(unittest.TestCase):
+    def test_is_loopback(self):
+        self.assertTrue(is_loopback("127.0.0.1"))
+        self.assertTrue(is_loopback("localhost"))
+        self.assertFalse(is_loopback("0.0.0.0"))
+        self.assertFalse(is_loopback("192.168.1.2"))
+    
+    def test_refuses_remote_addresses(self):
+        server = ConversionServer(jobs=1)
+        try:
+            with self.assertRaises(RuntimeError):
+                server.serve("0.0.0.0:0")
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
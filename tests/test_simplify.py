@@ -0,0 +1,69 @@
+import random
+import unittest
+
+from barkconv import AnimTrack
+from barkconv.evaluate import evaluate_track
+from barkconv.simplify import _round_color, simplify_track
+
+
+def random_track(rnd):
+    track = AnimTrack()
+    time = rnd.randint(0, 5)
+    value = rnd.randint(0, 255)
+    for i in range(rnd.randint(2, 12)):
+        # Smooth stretches with small steps, which can be simplified, and jumps, which can't
+        value = min(255, max(0, value + (rnd.randint(-4, 4) if rnd.random() < 0.7 else rnd.randint(-100, 100))))
+        tangent = rnd.randint(-20, 20)
+        track.add(time, value, tangent, tangent if rnd.random() < 0.5 else rnd.randint(-20, 20))
+        time += rnd.randint(1, 15)
+    return track
+
+
+def colors(track, duration):
+    return [_round_color(val) for val in evaluate_track(track, duration+1)]
+
+
+class SimplifyTrackTest(unittest.TestCase):
+    def test_colors_stay_within_tolerance(self):
+        rnd = random.Random(0)
+        removed = 0
+        
+        for trial in range(500):
+            track = random_track(rnd)
+            duration = max(0, track.time[-1] + rnd.randint(-5, 10))
+            tolerance = rnd.choice((0, 0, 1, 2, 5, 20))
+            
+            simplified = simplify_track(track, duration, tolerance)
+            before, after = colors(track, duration), colors(simplified, duration)
+            
+            self.assertLessEqual(len(simplified), len(track))
+            self.assertLessEqual(max(abs(a - b) for a, b in zip(before, after)), tolerance,
+                                 (list(track.rows()), duration, tolerance, list(simplified.rows())))
+            removed += len(track) - len(simplified)
+        
+        self.assertGreater(removed, 0)
+    
+    def test_constant_tracks_become_one_keyframe(self):
+        rnd = random.Random(1)
+        
+        for trial in range(100):
+            value = rnd.randint(0, 255)
+            track = AnimTrack()
+            time = 0
+            for i in range(rnd.randint(2, 8)):
+                track.add(time, value, 0, 0)
+                time += rnd.randint(1, 10)
+            
+            simplified = simplify_track(track, rnd.randint(0, 100))
+            self.assertEqual(list(simplified.rows()), [(0, value, 0, 0)])
+        
+        # Colors that only change by less than the tolerance
+        track = AnimTrack()
+        for i, value in enumerate((100, 101, 99, 100)):
+            track.add(i*10, value, 0, 0)
+        self.assertEqual(len(simplify_track(track, 30, 2)), 1)
+        self.assertGreater(len(simplify_track(track, 30, 0)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
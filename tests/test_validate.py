@@ -0,0 +1,29 @@
+import json
+import os
+import tempfile
+import unittest
+
+from barkconv import validate_file
+
+
+class ValidateJsonTest(unittest.TestCase):
+    def test_values_out_of_range(self):
+        brk = {
+            "loop_mode": 300, "duration": 70000,
+            "register_color_animations": [{"material_name": "m", "tevcolor": -1, "red": [], "green": [], "blue": [], "alpha": []}],
+            "constant_color_animations": [{"material_name": "k", "konstcolor": 2, "red": [], "green": [], "blue": [], "alpha": []}]
+        }
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "anim.json")
+            with open(path, "w") as f:
+                json.dump(brk, f)
+            issues = validate_file(path)
+        
+        self.assertEqual([(issue.severity, issue.code) for issue in issues], [("error", "header"), ("error", "header"), ("error", "range")])
+        for issue, field in zip(issues, ("loop_mode", "duration", "tevcolor")):
+            self.assertIn(field, issue.message)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import io
+import random
+import unittest
+
+import barkconv
+from barkconv import BRKAnim
+from barkconv.fingerprint import brk_fingerprint
+from barkconv.watch import IncrementalEncoder
+
+import benchmark
+
+
+class IncrementalEncoderTest(unittest.TestCase):
+    # The caller keeps editing and writing the same BRKAnim, which must not change
+    # what the encoder patches later
+    def test_patch_after_writing_the_brk_again(self):
+        for compact_tangents in (False, True):
+            with self.subTest(compact_tangents=compact_tangents):
+                rnd = random.Random(1)
+                brk = benchmark.make_brk(8, 4, 0.5)
+                encoder = IncrementalEncoder(compact_tangents=compact_tangents)
+                encoder.encode(brk)
+                patched = 0
+                
+                for step in range(60):
+                    anim = rnd.choice(brk.register_animations + brk.constant_animations)
+                    if rnd.random() < 0.2:
+                        anim.colornum = rnd.randrange(4)
+                    else:
+                        track = anim.component[rnd.choice("RGBA")]
+                        track[rnd.randrange(len(track))].value = rnd.randint(0, 255)
+                    
+                    data, updated = encoder.encode(brk)
+                    if updated is not None:
+                        patched += 1
+                    full = brk.to_bytes(compact_tangents=compact_tangents)
+                    self.assertEqual(brk_fingerprint(BRKAnim.from_bytes(bytes(data))), brk_fingerprint(BRKAnim.from_bytes(full)))
+                    
+                    # Writing the edited BRK lays out the value tables on the object again
+                    barkconv.write_brk(brk, io.BytesIO(), "overlap" if step % 2 else "dedup", not compact_tangents)
+                
+                self.assertGreater(patched, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()